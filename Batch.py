@@ -0,0 +1,73 @@
+import Parsers as Parsers
+import Database as Database
+import Logger as Logger
+import concurrent.futures as futures
+import os as os
+import sys
+import time as time
+from pathlib import Path
+
+# -----------------------------------------------------------------------
+# import a directory of saved statement text files into a database file,
+# run from the command line
+#
+#   python Batch.py database_file statement_directory [processes]
+#
+# the statements are read in parallel by a process pool, then merged into
+# the database in one pass and the database file is written. statements are
+# merged in file name order, so the result is the same as pasting them in
+# that order
+
+
+# -----------------------------------------------------------------------
+# statement files in a directory, in name order
+def statement_files(path: str) -> list:
+    return sorted(str(file) for file in Path(path).iterdir() if file.is_file())
+
+
+# -----------------------------------------------------------------------
+# read statement files with a pool of processes
+# returns a list of entries for each file, in the order of files
+def read_statement_files(files: list, processes: int = None) -> list:
+    if len(files) < 2 or processes == 1:
+        return [Parsers.read_statement_file(file) for file in files]
+
+    with futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(Parsers.read_statement_file, files))
+
+
+# -----------------------------------------------------------------------
+# import the statement files in a directory into the database
+# returns the entries added
+def import_directory(path: str, processes: int = None) -> list:
+    files = statement_files(path)
+    entries = []
+    for file, file_entries in zip(files, read_statement_files(files, processes)):
+        Logger.log_info(f'Read {len(file_entries)} entries from \'{file}\'')
+        entries += file_entries
+
+    with Database.lock:
+        added = Database.merge_statement_entries(entries)
+        Database.update_summaries()
+        if len(added) > 0:
+            Database.set_dirty()
+
+    Logger.log_info(f'Imported {len(files)} statements, {len(added)} of {len(entries)} entries are new')
+    return added
+
+
+# -----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    if len(sys.argv) < 3:
+        print('usage: python Batch.py database_file statement_directory [processes]', file=sys.stderr)
+        sys.exit(1)
+
+    start = time.perf_counter()
+    if not Database.load_database(sys.argv[1]):
+        sys.exit(1)
+    import_directory(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count())
+
+    if Database.get_is_dirty():
+        Database.save_file(sys.argv[1])
+    Logger.log_info(f'Took {time.perf_counter() - start:.2f}s')
@@ -0,0 +1,274 @@
+import StatementData as StatementData
+import Database as Database
+import Parsers as Parsers
+import Logger as Logger
+import datetime as datetime
+import gc as gc
+import json as json
+import os as os
+import platform as platform
+import random as random
+import subprocess as subprocess
+import tempfile as tempfile
+import time as time
+import tracemalloc as tracemalloc
+import sys
+
+# -----------------------------------------------------------------------
+# benchmarks, run from the command line
+#
+#   python Benchmark.py [results.json [rows ...]]
+#
+# times loading, parsing, summarising and saving synthetic data at each
+# number of rows, 1k, 100k and 1M by default, and records the peak memory
+# of each step, then the memory per entry with and without __slots__. the
+# results are printed and written as JSON so they can be compared between
+# commits
+
+PAYEES = ['CARD PAYMENT TO TESCO STORES 3456', 'GOOGLE PAY CHIPPENHAM CAFFE NERO CHIPPENHAM',
+          'CARD PAYMENT TO MIPERMIT', 'DIRECT DEBIT PAYMENT TO EDF ENERGY', 'AMAZON.CO.UK*2R4T61',
+          'FASTER PAYMENT RECEIVED', 'CARD PAYMENT TO SHELL CHIPPENHAM', 'SAINSBURYS S/MKTS']
+
+SIZES = [1000, 100000, 1000000]
+
+# entries added one at a time by the add_statement_entry benchmark
+ADDED_ENTRIES = 1000
+
+# entries added before the save_file benchmark
+JOURNAL_ENTRIES = 20
+
+
+# -----------------------------------------------------------------------
+# statement entry as it was before StatementEntry had __slots__, fields in an
+# instance dict with the type as an enum and the date as a date. only used to
+# compare memory per entry
+class DictStatementEntry:
+
+    def __init__(self,
+                 type: StatementData.StatementEntryType = StatementData.StatementEntryType.NONE,
+                 amount: int = 0,
+                 balance: int = 0,
+                 date: datetime.date = datetime.date(2000, 1, 1),
+                 week_no: int = 0,
+                 seq_no: int = 0,
+                 included_weekly: bool = False,
+                 included_monthly: bool = False,
+                 description: str = "") -> None:
+        self._type = type
+        self._amount = amount
+        self._balance = balance
+        self._date = date
+        self._week_no = week_no
+        self._seq_no = seq_no
+        self._included_weekly = included_weekly
+        self._included_monthly = included_monthly
+        self._description = description
+        self._is_new = False
+        self._user_excluded = False
+
+
+# -----------------------------------------------------------------------
+# create n entries with made up but realistic values, in date order
+def synthetic_entries(n: int, seed: int = 1, types: list = None,
+                      entry_class=StatementData.StatementEntry) -> []:
+    rnd = random.Random(seed)
+    start = datetime.date(2015, 1, 5).toordinal()
+    if types is None:
+        types = [StatementData.StatementEntryType.SANTANDER_CREDIT_CARD,
+                 StatementData.StatementEntryType.SANTANDER_CURRENT_ACCOUNT,
+                 StatementData.StatementEntryType.CASH_PLUS]
+    entries = []
+    for i in range(n):
+        date = datetime.date.fromordinal(start + i * 3650 // n)
+        entry = entry_class(
+            type=rnd.choice(types),
+            amount=rnd.randint(-150000, 50000),
+            balance=rnd.randint(0, 5000000),
+            date=date,
+            week_no=(date.toordinal() - start) // 7,
+            seq_no=i,
+            included_weekly=rnd.random() < 0.7,
+            included_monthly=rnd.random() < 0.5,
+            description=f'{rnd.choice(PAYEES)} {rnd.randint(1000, 9999)}')
+        entries.append(entry)
+    return entries
+
+
+# -----------------------------------------------------------------------
+# write a "Money Reckoner 1.40" file of n synthetic entries
+def write_synthetic_file(file_name: str, n: int, binary: bool = False) -> None:
+    Database.bulk_load_statement_entries(synthetic_entries(n))
+    Database.assign_seq_nos()
+    Database.generate_weekly_summaries()
+    Database.generate_monthly_summaries()
+    Database.write_file(file_name, binary)
+
+
+# -----------------------------------------------------------------------
+# statement text of n synthetic entries of one type, laid out as pasted from
+# the bank's web site
+def synthetic_statement(statement_type: StatementData.StatementEntryType, n: int, seed: int = 2) -> str:
+    lines = []
+    if statement_type == StatementData.StatementEntryType.SANTANDER_CURRENT_ACCOUNT:
+        lines += ['1|2|3 Current Account earnings',
+                  Parsers.header_text(['Date', 'Description', 'Money in', 'Money out', 'Balance'])]
+    elif statement_type == StatementData.StatementEntryType.SANTANDER_CREDIT_CARD:
+        lines += ['1|2|3 Credit Card earnings',
+                  Parsers.header_text(['Date', 'Card no.', 'Description', 'Money in', 'Money out'])]
+    else:
+        lines += ['CashPlus Online Banking', 'Balance']
+
+    for entry in synthetic_entries(n, seed, [statement_type]):
+        date = entry.date.strftime('%d/%m/%Y')
+        amount = StatementData.money_str(abs(entry.amount))
+        balance = StatementData.money_str(entry.balance)
+        credit, debit = (amount, '') if entry.amount >= 0 else ('', amount)
+
+        if statement_type == StatementData.StatementEntryType.SANTANDER_CURRENT_ACCOUNT:
+            lines.append(f'{date}\t{entry.description}\t{credit}\t{debit}\t{balance}')
+        elif statement_type == StatementData.StatementEntryType.SANTANDER_CREDIT_CARD:
+            lines.append(f'{date}\t**3878\t{entry.description}\t{credit}\t{debit}')
+        else:
+            lines += [f'{date}\t5587', entry.description]
+            if os.name == 'nt':
+                lines.append(f'{debit}\t{balance}' if entry.amount < 0 else f'{credit}\t\t{balance}')
+            else:
+                lines.append(f'\t{credit}\t{debit}\t{balance}')
+
+    lines.append('')
+    return '\n'.join(lines)
+
+
+# -----------------------------------------------------------------------
+# time run() and then measure its peak memory in a second run, setup() is
+# called before each run and is not measured
+def measure(results: list, rows: int, step: str, setup, run) -> None:
+    setup()
+    gc.collect()
+    start = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - start
+
+    setup()
+    gc.collect()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    results.append({'rows': rows, 'step': step, 'seconds': round(seconds, 6), 'peak_bytes': peak})
+    print(f'{rows:>9} {step:<40} {seconds:10.3f}s {peak / 2 ** 20:10.1f} MB')
+
+
+# -----------------------------------------------------------------------
+# run the benchmarks at n rows
+def benchmark(results: list, n: int, directory: str) -> None:
+    text_file = os.path.join(directory, f'bench{n}.txt')
+    binary_file = os.path.join(directory, f'bench{n}.mrb')
+    sqlite_file = os.path.join(directory, f'bench{n}.db')
+
+    def load() -> None:
+        Database.read_file(text_file)
+
+    def load_with_summaries() -> None:
+        load()
+        Database.generate_weekly_summaries()
+        Database.generate_monthly_summaries()
+
+    write_synthetic_file(text_file, n)
+
+    measure(results, n, 'write_file', load, lambda: Database.write_file(text_file))
+    measure(results, n, 'write_file binary', load_with_summaries, lambda: Database.write_file(binary_file, True))
+    measure(results, n, 'write_file sqlite', load, lambda: Database.write_file(sqlite_file))
+    measure(results, n, 'read_file', lambda: None, load)
+    measure(results, n, 'read_file binary', lambda: None, lambda: Database.read_file(binary_file))
+    measure(results, n, 'read_file sqlite', lambda: None, lambda: Database.read_file(sqlite_file))
+    measure(results, n, 'load_database lazy', lambda: None, lambda: Database.load_database(binary_file, lazy=True))
+    measure(results, n, 'load_database lazy sqlite', lambda: None,
+            lambda: Database.load_database(sqlite_file, lazy=True))
+    measure(results, n, 'generate_weekly_summaries', load, Database.generate_weekly_summaries)
+    measure(results, n, 'generate_monthly_summaries', load, Database.generate_monthly_summaries)
+
+    added = []
+
+    def setup_added() -> None:
+        load()
+        added[:] = synthetic_entries(min(n, ADDED_ENTRIES), seed=3)
+        Database.added_entries.clear()
+
+    def add() -> None:
+        for entry in added:
+            Database.add_statement_entry(Database.statement_entries, entry)
+
+    measure(results, n, f'add_statement_entry x{min(n, ADDED_ENTRIES)}', setup_added, add)
+
+    def setup_journal() -> None:
+        if os.path.exists(Database.journal_name(text_file)):
+            os.remove(Database.journal_name(text_file))
+        Database.load_database(text_file)
+        Database.merge_statement_entries(synthetic_entries(JOURNAL_ENTRIES, seed=4))
+        Database.update_summaries()
+
+    # saving a small import appends to the journal rather than writing the file
+    measure(results, n, f'save_file journal x{JOURNAL_ENTRIES}', setup_journal,
+            lambda: Database.save_file(text_file))
+
+    for statement_type, step in [(StatementData.StatementEntryType.SANTANDER_CURRENT_ACCOUNT,
+                                  'parse santander current account'),
+                                 (StatementData.StatementEntryType.SANTANDER_CREDIT_CARD,
+                                  'parse santander credit card'),
+                                 (StatementData.StatementEntryType.CASH_PLUS,
+                                  'parse cash plus')]:
+        # the parser on its own, adding the entries is add_statement_entry
+        text = synthetic_statement(statement_type, n)
+        measure(results, n, step, lambda: None, lambda: Parsers.read_statement(Parsers.split_lines(text), []))
+        del text
+
+
+# -----------------------------------------------------------------------
+# memory used by each statement entry, including its field values
+def memory_per_entry(n: int, entry_class=StatementData.StatementEntry) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entries = synthetic_entries(n, entry_class=entry_class)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(entries)
+
+
+# -----------------------------------------------------------------------
+# the current git commit, if there is one
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+# -----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    json_file = sys.argv[1] if len(sys.argv) > 1 else None
+    sizes = [int(arg) for arg in sys.argv[2:]] if len(sys.argv) > 2 else SIZES
+
+    Logger.set_level(Logger.ERROR)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            benchmark(results, n, directory)
+
+    n = min(sizes[-1], 100000)
+    report = {'commit': git_commit(),
+              'date': datetime.datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'entry_bytes': round(memory_per_entry(n)),
+              'dict_entry_bytes': round(memory_per_entry(n, DictStatementEntry)),
+              'results': results}
+    print(f'StatementEntry memory: {report["entry_bytes"]} bytes per entry, '
+          f'{report["dict_entry_bytes"]} without __slots__ ({n} entries)')
+
+    if json_file is not None:
+        with open(json_file, mode='w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
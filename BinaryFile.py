@@ -0,0 +1,277 @@
+import StatementData as StatementData
+import datetime as datetime
+import array as array
+import struct as struct
+import sys as sys
+from pathlib import Path
+
+# -----------------------------------------------------------------------
+# Money Reckoner 2.x binary file
+#
+# a text header line followed by fixed width columns, one value per entry
+# in each column, so a file can be loaded without parsing each row
+#
+#   "Money Reckoner 2.1\n", zero padded to a multiple of 8 bytes
+#   entry count n, description data length                  <QQ
+#   amount in pence                                         int64 x n
+#   balance in pence                                        int64 x n
+#   description offsets into the description data          uint64 x n + 1
+#   date as an ordinal                                      int32 x n
+#   week no                                                 int32 x n
+#   seq no                                                  int32 x n
+#   type, StatementEntryType value                          uint8 x n
+#   flags, 1 included weekly, 2 included monthly, 4 user excluded  uint8 x n
+#   descriptions, utf-8 end to end
+#
+# v2.1 adds a footer with the weekly and monthly summaries, zero padded to
+# start on a multiple of 8 bytes
+#
+#   weekly summary count w, monthly summary count m         <QQ
+#   weekly total in pence                                   int64 x w
+#   weekly summary date as an ordinal                       int32 x w
+#   weekly week no                                          int32 x w
+#   weekly transactions                                     int32 x w
+#   weekly entry count                                      int32 x w
+#   monthly total in pence                                  int64 x m
+#   monthly summary date as an ordinal                      int32 x m
+#   monthly transactions                                    int32 x m
+#   monthly entry count                                     int32 x m
+#
+# each summary covers the next entry count entries, in order.
+# all values are little endian, columns are in order of decreasing width
+# so each one is aligned to its own size
+
+# binary files are named *.mrb
+FILE_SUFFIXES = ['.mrb']
+
+HEADER = 'Money Reckoner 2.1'
+HEADERS = ['Money Reckoner 2.0', 'Money Reckoner 2.1']
+
+FLAG_INCLUDED_WEEKLY = 1
+FLAG_INCLUDED_MONTHLY = 2
+FLAG_USER_EXCLUDED = 4
+
+# column name, array type code, entries in the column in addition to n
+COLUMNS = [('amount', 'q', 0),
+           ('balance', 'q', 0),
+           ('description_offset', 'Q', 1),
+           ('date', 'i', 0),
+           ('week_no', 'i', 0),
+           ('seq_no', 'i', 0),
+           ('type', 'B', 0),
+           ('flags', 'B', 0)]
+
+WEEKLY_COLUMNS = [('weekly_total', 'q', 0),
+                  ('weekly_date', 'i', 0),
+                  ('weekly_week_no', 'i', 0),
+                  ('weekly_transactions', 'i', 0),
+                  ('weekly_count', 'i', 0)]
+
+MONTHLY_COLUMNS = [('monthly_total', 'q', 0),
+                   ('monthly_date', 'i', 0),
+                   ('monthly_transactions', 'i', 0),
+                   ('monthly_count', 'i', 0)]
+
+_COUNTS = struct.Struct('<QQ')
+
+# StatementEntryType by value
+_TYPES = {t.value: t for t in StatementData.StatementEntryType}
+
+
+# -----------------------------------------------------------------------
+# is a file name one of a binary file
+def is_binary_name(file_name: str) -> bool:
+    return Path(file_name).suffix.lower() in FILE_SUFFIXES
+
+
+# -----------------------------------------------------------------------
+# is the first line of a file, without the line end, a binary file header
+def is_binary_header(line: bytes) -> bool:
+    return line.decode('utf-8', 'replace') in HEADERS
+
+
+# -----------------------------------------------------------------------
+# length of the header including padding
+def header_size() -> int:
+    n = len(HEADER) + 1
+    return n + (-n % 8)
+
+
+# -----------------------------------------------------------------------
+# write columns to a file, the columns dictionary has an array for each
+# name in layout
+# returns number of bytes written
+def write_columns(f, layout: [], columns: dict) -> int:
+    size = 0
+    for name, code, extra in layout:
+        column = columns[name]
+        if sys.byteorder == 'big':
+            column.byteswap()
+        size += f.write(column.tobytes())
+    return size
+
+
+# -----------------------------------------------------------------------
+# read columns from a view of the file starting at pos
+# returns position after the columns
+def read_columns_at(view: memoryview, pos: int, layout: [], n: int, columns: dict) -> int:
+    for name, code, extra in layout:
+        size = array.array(code).itemsize * (n + extra)
+        if pos + size > len(view):
+            raise RuntimeError('Binary file is truncated')
+        if sys.byteorder == 'little':
+            columns[name] = view[pos:pos + size].cast(code)
+        else:
+            column = array.array(code)
+            column.frombytes(view[pos:pos + size])
+            column.byteswap()
+            columns[name] = column
+        pos += size
+    return pos
+
+
+# -----------------------------------------------------------------------
+# write entries to a file opened in binary mode, along with the weekly and
+# monthly summaries that cover them if given
+def write(f, entries: [], weekly_summaries: [] = None, monthly_summaries: [] = None) -> None:
+
+    descriptions = [e.description.encode('utf-8') for e in entries]
+    offsets = array.array('Q', [0])
+    n = 0
+    for d in descriptions:
+        n += len(d)
+        offsets.append(n)
+
+    columns = {
+        'amount': array.array('q', [e.amount for e in entries]),
+        'balance': array.array('q', [e.balance for e in entries]),
+        'description_offset': offsets,
+        'date': array.array('i', [e.date.toordinal() for e in entries]),
+        'week_no': array.array('i', [e.week_no for e in entries]),
+        'seq_no': array.array('i', [e.seq_no for e in entries]),
+        'type': array.array('B', [e.type.value for e in entries]),
+        'flags': array.array('B', [(FLAG_INCLUDED_WEEKLY if e.included_weekly else 0) |
+                                   (FLAG_INCLUDED_MONTHLY if e.included_monthly else 0) |
+                                   (FLAG_USER_EXCLUDED if e.user_excluded else 0) for e in entries])}
+
+    pos = f.write((HEADER + '\n').encode('utf-8').ljust(header_size(), b'\0'))
+    pos += f.write(_COUNTS.pack(len(entries), n))
+    pos += write_columns(f, COLUMNS, columns)
+    pos += f.write(b''.join(descriptions))
+    f.write(b'\0' * (-pos % 8))
+
+    # summaries footer, left empty unless the summaries cover all the entries
+    weekly_summaries = weekly_summaries or []
+    monthly_summaries = monthly_summaries or []
+    if sum(len(s.entries) for s in weekly_summaries) != len(entries) or \
+            sum(len(s.entries) for s in monthly_summaries) != len(entries):
+        weekly_summaries = []
+        monthly_summaries = []
+    columns = {
+        'weekly_total': array.array('q', [s.total for s in weekly_summaries]),
+        'weekly_date': array.array('i', [s.summary_date.toordinal() for s in weekly_summaries]),
+        'weekly_week_no': array.array('i', [int(s.summary_id) for s in weekly_summaries]),
+        'weekly_transactions': array.array('i', [s.transactions for s in weekly_summaries]),
+        'weekly_count': array.array('i', [len(s.entries) for s in weekly_summaries]),
+        'monthly_total': array.array('q', [s.total for s in monthly_summaries]),
+        'monthly_date': array.array('i', [s.summary_date.toordinal() for s in monthly_summaries]),
+        'monthly_transactions': array.array('i', [s.transactions for s in monthly_summaries]),
+        'monthly_count': array.array('i', [len(s.entries) for s in monthly_summaries])}
+
+    f.write(_COUNTS.pack(len(weekly_summaries), len(monthly_summaries)))
+    write_columns(f, WEEKLY_COLUMNS, columns)
+    write_columns(f, MONTHLY_COLUMNS, columns)
+
+
+# -----------------------------------------------------------------------
+# read the columns of a binary file from a bytes like object
+# returns dictionary of column name to a sequence of values, the columns are
+# views on data when the byte order allows, the descriptions are left as bytes.
+# the summary columns are only present for v2.1 files
+def read_columns(data) -> dict:
+
+    view = memoryview(data)
+    header = bytes(view[:header_size()]).split(b'\n')[0]
+    if not is_binary_header(header):
+        raise RuntimeError(f'Invalid header \'{header}\', expected \'{HEADER}\'')
+
+    columns = {}
+    pos = header_size()
+    n, description_length = _COUNTS.unpack_from(view, pos)
+    pos = read_columns_at(view, pos + _COUNTS.size, COLUMNS, n, columns)
+
+    columns['description'] = view[pos:pos + description_length]
+    if len(columns['description']) != description_length:
+        raise RuntimeError('Binary file is truncated')
+    pos += description_length
+    pos += -pos % 8
+
+    if header.decode('utf-8') != 'Money Reckoner 2.0':
+        w, m = _COUNTS.unpack_from(view, pos)
+        pos = read_columns_at(view, pos + _COUNTS.size, WEEKLY_COLUMNS, w, columns)
+        read_columns_at(view, pos, MONTHLY_COLUMNS, m, columns)
+
+    return columns
+
+
+# -----------------------------------------------------------------------
+# do the summary columns cover all the entries
+def has_summaries(columns: dict) -> bool:
+    n = column_length(columns)
+    return 'weekly_count' in columns and \
+           sum(columns['weekly_count']) == n and \
+           sum(columns['monthly_count']) == n
+
+
+# -----------------------------------------------------------------------
+# number of entries in the columns
+def column_length(columns: dict) -> int:
+    return len(columns['type'])
+
+
+# -----------------------------------------------------------------------
+# create the statement entry in row n of the columns
+def entry_from_columns(columns: dict, n: int) -> StatementData.StatementEntry:
+    flags = columns['flags'][n]
+    offsets = columns['description_offset']
+    entry = StatementData.StatementEntry(
+        type=_TYPES.get(columns['type'][n], StatementData.StatementEntryType.NONE),
+        amount=columns['amount'][n],
+        balance=columns['balance'][n],
+        date=datetime.date.fromordinal(columns['date'][n]),
+        week_no=columns['week_no'][n],
+        seq_no=columns['seq_no'][n],
+        included_weekly=bool(flags & FLAG_INCLUDED_WEEKLY),
+        included_monthly=bool(flags & FLAG_INCLUDED_MONTHLY),
+        description=bytes(columns['description'][offsets[n]:offsets[n + 1]]).decode('utf-8'))
+    entry.user_excluded = bool(flags & FLAG_USER_EXCLUDED)
+    return entry
+
+
+# -----------------------------------------------------------------------
+# read all the entries from a bytes like object
+def read(data) -> []:
+    columns = read_columns(data)
+    offsets = columns['description_offset'].tolist()
+    descriptions = bytes(columns['description'])
+    entries = []
+
+    rows = zip(columns['type'].tolist(), columns['amount'].tolist(), columns['balance'].tolist(),
+               columns['date'].tolist(), columns['week_no'].tolist(), columns['seq_no'].tolist(),
+               columns['flags'].tolist(), offsets, offsets[1:])
+
+    for t, amount, balance, date, week_no, seq_no, flags, start, end in rows:
+        entry = StatementData.StatementEntry(
+            type=_TYPES.get(t, StatementData.StatementEntryType.NONE),
+            amount=amount,
+            balance=balance,
+            date=datetime.date.fromordinal(date),
+            week_no=week_no,
+            seq_no=seq_no,
+            included_weekly=bool(flags & FLAG_INCLUDED_WEEKLY),
+            included_monthly=bool(flags & FLAG_INCLUDED_MONTHLY),
+            description=descriptions[start:end].decode('utf-8'))
+        entry.user_excluded = bool(flags & FLAG_USER_EXCLUDED)
+        entries.append(entry)
+
+    return entries
@@ -0,0 +1,111 @@
+import Database as Database
+import Instrument as Instrument
+import Logger as Logger
+import threading as threading
+import time as time
+
+# -----------------------------------------------------------------------
+# saves the database in the background after it is changed. changes are
+# coalesced, the database is saved once there has been no change for the
+# quiet period, or after MAX_CHANGES changes if changes keep coming. saving
+# is done by Database.save_file, so a checkpoint normally only appends the
+# changes to the journal of the file the database was loaded from.
+#
+# the checkpointer never compacts the journal, as writing the whole file
+# closes a lazily loaded file that the GUI may be reading. compact is run as
+# a Worker job instead, while the views are frozen
+
+
+# -----------------------------------------------------------------------
+# save the database to the file it was loaded from or last saved to, if it
+# has changed, compacting its journal if it is due and compact is set
+# returns False if it could not be saved, or if there is no file to save it
+# to as the file could not be loaded
+def checkpoint(compact: bool = True) -> bool:
+    with Database.lock:
+        if not Database.get_is_dirty():
+            return True
+        if Database.journal_file is None:
+            return False
+        if not Database.save_file(Database.journal_file, compact=compact):
+            return False
+        Database.set_dirty(False)
+        return True
+
+
+# -----------------------------------------------------------------------
+# write the whole database file if its journal is due to be compacted
+# returns False if it could not be written
+def compact() -> bool:
+    with Database.lock:
+        if not Database.is_compaction_due():
+            return True
+        if not Database.write_file(Database.journal_file):
+            return False
+        Database.set_dirty(False)
+        return True
+
+
+# -----------------------------------------------------------------------
+class Checkpointer:
+
+    # seconds without a change before saving
+    QUIET_PERIOD = 2.0
+
+    # changes before saving while changes are still being made
+    MAX_CHANGES = 50
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._changes = 0
+        self._last_change = 0.0
+        self._stopped = False
+        self._thread = None
+
+    # -----------------------------------------------------------------------
+    # start listening for changes and saving them
+    def start(self) -> None:
+        self._stopped = False
+        Database.set_dirty_listener(self.on_dirty)
+        self._thread = threading.Thread(target=self.run, name='checkpointer', daemon=True)
+        self._thread.start()
+
+    # -----------------------------------------------------------------------
+    # stop saving, changes not yet saved are left to the caller. waits for a
+    # checkpoint in progress, so it is not called holding Database.lock
+    def stop(self) -> None:
+        Database.set_dirty_listener(None)
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # -----------------------------------------------------------------------
+    # the database was changed, any thread
+    def on_dirty(self) -> None:
+        with self._condition:
+            self._changes += 1
+            self._last_change = time.monotonic()
+            self._condition.notify()
+
+    # -----------------------------------------------------------------------
+    # checkpointer thread, waits for a change then for the quiet period
+    def run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopped and self._changes == 0:
+                    self._condition.wait()
+                while not self._stopped and self._changes < self.MAX_CHANGES:
+                    quiet = self._last_change + self.QUIET_PERIOD - time.monotonic()
+                    if quiet <= 0:
+                        break
+                    self._condition.wait(quiet)
+                if self._stopped:
+                    return
+                changes = self._changes
+                self._changes = 0
+
+            Logger.log_debug(f'Checkpoint after {changes} changes')
+            Instrument.run_profiled(lambda: checkpoint(compact=False))
@@ -0,0 +1,62 @@
+import tkinter as tk
+
+# -----------------------------------------------------------------------
+# watches the clipboard for new text. Tk has no clipboard change event so the
+# clipboard is polled, quickly after a change or when the window gets the
+# focus, backing off while nothing changes. the previous text is not kept,
+# its length is compared first and then its hash
+class ClipboardWatcher:
+
+    # poll intervals, ms
+    MIN_INTERVAL = 250
+    MAX_INTERVAL = 4000
+
+    def __init__(self, window: tk.Tk, on_text) -> None:
+        self._window = window
+        self._on_text = on_text
+        self._length = 0
+        self._hash = hash('')
+        self._interval = self.MIN_INTERVAL
+        self._after = None
+
+        # text copied elsewhere is likely to be pasted here next
+        window.bind('<FocusIn>', self.on_focus, add='+')
+
+    # -----------------------------------------------------------------------
+    # start polling
+    def start(self) -> None:
+        self._after = self._window.after(self._interval, self.poll)
+
+    # -----------------------------------------------------------------------
+    # is text different to the last text seen, remembers it if it is
+    def is_new(self, text: str) -> bool:
+        if len(text) == self._length and hash(text) == self._hash:
+            return False
+        self._length = len(text)
+        self._hash = hash(text)
+        return True
+
+    # -----------------------------------------------------------------------
+    def poll(self) -> None:
+        try:
+            text = self._window.clipboard_get()
+        except tk.TclError:
+            # clipboard was empty
+            text = ''
+
+        if self.is_new(text):
+            self._interval = self.MIN_INTERVAL
+            self._on_text(text)
+        else:
+            self._interval = min(self._interval * 2, self.MAX_INTERVAL)
+
+        self._after = self._window.after(self._interval, self.poll)
+
+    # -----------------------------------------------------------------------
+    # poll soon after the window gets the focus
+    def on_focus(self, event) -> None:
+        if self._interval > self.MIN_INTERVAL:
+            self._interval = self.MIN_INTERVAL
+            if self._after is not None:
+                self._window.after_cancel(self._after)
+            self.start()
@@ -1,34 +1,113 @@
 
 
 import StatementData as StatementData
+import BinaryFile as BinaryFile
+import LazyEntries as LazyEntries
+import SqliteFile as SqliteFile
 import Logger as Logger
+import Rules as Rules
 import datetime as datetime
 import copy as copy
+import bisect as bisect
+import os as os
+import threading as threading
+import sys as sys
 
-# the database of statement data
+# held while the database globals are read or changed by a thread other than
+# the GUI thread, or by the GUI thread while another thread may be using them
+lock = threading.RLock()
+
+# the database of statement data, money is in pence
 statement_entries: list = []
 weekly_summaries: list = []
 monthly_summaries: list = []
 yearly_spend: int = 0
 yearly_budget: int = 0
 
+# summaries by week no and by month str
+weekly_index: dict = {}
+monthly_index: dict = {}
+
+# start of the year yearly_spend covers, the last april monthly summary
+yearly_spend_start: datetime.date = None
+
+# entries added to statement_entries since the summaries were last updated
+added_entries: list = []
+
+# dedup index for statement_entries, set of StatementData.dedup_key,
+# kept in step with statement_entries by add_statement_entry and
+# merge_statement_entries, entries are never removed.
+# None when statement_entries is loaded lazily
+statement_keys: set = set()
+
 # parsed text, list of tuples (valid data: bool, text line: str)
 parsed_text = []
 
 # does data need committing to file
 is_dirty: bool = False
 
+# function called with no arguments each time the database is changed, from
+# the thread making the change while it holds lock, see Checkpoint
+dirty_listener = None
+
 # current max entry sequence no
 seq_no: int = -1
 
+# the database file whose journal holds the changes saved since the file was
+# last written, and the number of records in the journal
+journal_file: str = None
+journal_records: int = 0
+
+# changes not yet saved, entries added and entries whose inclusion or user
+# exclusion changed by StatementData.dedup_key
+unsaved_entries: list = []
+unsaved_updates: dict = {}
+
+JOURNAL_HEADER = 'Money Reckoner Journal 1.40'
+
+# least journal records before the journal is compacted into the database file,
+# after that it is compacted once it has a tenth as many records as there are
+# entries, so compaction costs O(1) per record
+JOURNAL_RECORDS = 1000
+
 
 # ------------------------------------------------------
-#
-def load_database(filename: str):
-    read_file(filename)
-    generate_weekly_summaries()
-    generate_monthly_summaries()
+# lazy, if the file is a binary file with summaries then memory map it and
+# only create entries when they are used, see read_lazy_file. the journal of
+# the file is then replayed onto the entries and summaries, see read_journal.
+# a file that does not exist is a new, empty database. if the file can not be
+# read journal_file is left None, so nothing is saved over the file unless it
+# is saved to by name
+# returns False if the file could not be read
+def load_database(filename: str, lazy: bool = False) -> bool:
+    global journal_file
+    global journal_records
+
+    journal_file = None
+    journal_records = 0
+    unsaved_entries.clear()
+    unsaved_updates.clear()
+
+    if lazy and read_lazy_file(filename):
+        loaded = True
+    else:
+        if os.path.exists(filename):
+            loaded = read_file(filename)
+        else:
+            Logger.log_info(f'No file \'{filename}\', starting a new database')
+            bulk_load_statement_entries([])
+            reset_seq_no()
+            loaded = True
+        generate_weekly_summaries()
+        generate_monthly_summaries()
+
+    if loaded:
+        journal_records = read_journal(filename)
+        journal_file = filename
+    else:
+        Logger.log_error(f'Could not load \'{filename}\', changes will not be saved to it')
     set_dirty(False)
+    return loaded
 
 
 # ------------------------------------------------------
@@ -38,6 +117,8 @@ def set_dirty(dirty: bool = True):
     if is_dirty != dirty:
         Logger.log_info(f'Dirty flag changed {is_dirty} -> {dirty}')
     is_dirty = dirty
+    if dirty and dirty_listener is not None:
+        dirty_listener()
 
 
 def get_is_dirty():
@@ -45,25 +126,67 @@ def get_is_dirty():
     return is_dirty
 
 
+def set_dirty_listener(listener) -> None:
+    global dirty_listener
+    dirty_listener = listener
+
+
 # ------------------------------------------------------
 # add entry to statement entries list in the correct order
 # returns position in list if added to list, -1 if it already exists in the list
 def add_statement_entry(entries: [], entry: StatementData.StatementEntry) -> int:
 
-    n = 0
-    while n < len(entries):
-
-        if StatementData.is_equal_statement_entries(entry, entries[n]):
+    indexed = entries is statement_entries and statement_keys is not None
+    if indexed:
+        # duplicate check against the hash index
+        key = StatementData.dedup_key(entry)
+        if key in statement_keys:
             return -1
+    elif find_equal_statement_entry(entries, entry) != -1:
+        return -1
+
+    # binary search for the sorted position, after any entries that compare equal
+    n = bisect.bisect_right(entries, StatementData.sort_key(entry), key=StatementData.sort_key)
+    entries.insert(n, entry)
 
-        if StatementData.compare_statement_entries(entry, entries[n]) == -1:
-            entries.insert(n, entry)
+    if indexed:
+        statement_keys.add(key)
+    if entries is statement_entries:
+        added_entries.append(entry)
+
+    return n
+
+
+# ------------------------------------------------------
+# find entry itself in a sorted list of entries
+# returns position in list, -1 if not found
+def index_of_statement_entry(entries: [], entry: StatementData.StatementEntry) -> int:
+
+    key = StatementData.sort_key(entry)
+    n = bisect.bisect_left(entries, key, key=StatementData.sort_key)
+    while n < len(entries) and StatementData.sort_key(entries[n]) == key:
+        if entries[n] is entry:
             return n
+        n += 1
+
+    return -1
 
+
+# ------------------------------------------------------
+# find an entry equal to entry in a sorted list of entries, equal entries
+# share a date so only entries on that date are checked
+# returns position in list, -1 if not found
+def find_equal_statement_entry(entries: [], entry: StatementData.StatementEntry) -> int:
+
+    # the date on its own sorts before any sort key with that date
+    date = StatementData.sort_key(entry)[:1]
+    n = bisect.bisect_left(entries, date, key=StatementData.sort_key)
+    while n < len(entries) and StatementData.sort_key(entries[n])[:1] == date:
+        if StatementData.is_equal_statement_entries(entry, entries[n]):
+            return n
         n += 1
 
-    entries.append(entry)
-    return n
+    return -1
 
 
 # -----------------------------------------------------
@@ -83,11 +206,25 @@ def reset_seq_no() -> None:
 
 # -----------------------------------------------------
 # read data from file
-def read_file(file_name: str) -> bool:
+# bulk, parse all the lines then sort and dedupe them in one go rather than
+# adding each line in turn with add_statement_entry, both give the same entries
+def read_file(file_name: str, bulk: bool = True) -> bool:
     global statement_entries
+    global statement_keys
     statement_entries = []
+    statement_keys = set()
+    added_entries.clear()
 
     try:
+        if SqliteFile.is_sqlite_file(file_name):
+            return read_sqlite_file(file_name)
+
+        # binary files are read straight into columns
+        with open(file_name, mode='rb') as f:
+            if BinaryFile.is_binary_header(f.readline()[:-1]):
+                f.seek(0)
+                return read_binary_file(file_name, f.read())
+
         with open(file_name, mode='r', encoding="utf-8") as f:
             ls = f.readlines()
 
@@ -104,19 +241,22 @@ def read_file(file_name: str) -> bool:
             raise RuntimeError(f'Invalid header \'{ls[0]}\' in file \'{file_name}\'')
 
         # parse lines from file
+        entries = []
         for n in range(1, len(ls)):
             entry = StatementData.StatementEntry()
             if entry.from_csv(ls[n], vers):
-                entry.lookup = add_statement_entry(statement_entries, entry)
+                if bulk:
+                    entries.append(entry)
+                else:
+                    add_statement_entry(statement_entries, entry)
             else:
                 Logger.log_error(f'Error parsing line ({n}) : \'{ls[n]}\'')
                 return False
 
-        # assign sequence numbers
-        reset_seq_no()
-        for entry in statement_entries:
-            entry.seq_no = next_seq_no()
+        if bulk:
+            bulk_load_statement_entries(entries)
 
+        assign_seq_nos()
         Logger.log_info(f'Read {len(statement_entries)} entries from file \'{file_name}\'')
         global seq_no
         Logger.log_info(f'Max sequence number: {seq_no}')
@@ -130,34 +270,427 @@ def read_file(file_name: str) -> bool:
         return False
 
 
-# ------------------------------------------------------
-# write to file
-def write_file (filename: str) -> bool:
+# -----------------------------------------------------
+# read data from the contents of a binary file
+def read_binary_file(file_name: str, data) -> bool:
+    bulk_load_statement_entries(BinaryFile.read(data))
+    assign_seq_nos()
+    Logger.log_info(f'Read {len(statement_entries)} entries from binary file \'{file_name}\'')
+    Logger.log_info(f'Max sequence number: {seq_no}')
+    return True
+
 
+# -----------------------------------------------------
+# read data from an SQLite file
+def read_sqlite_file(file_name: str) -> bool:
     try:
-        with open(filename, mode='w', encoding="utf-8") as f:
-            f.write("Money Reckoner 1.40\n")
-            global statement_entries
-            for se in statement_entries:
-                f.write(se.to_csv())
-                f.write('\n')
+        bulk_load_statement_entries(SqliteFile.read(file_name))
+    except SqliteFile.sqlite3.Error as e:
+        Logger.log_error(f'Could not read SQLite file \'{file_name}\': {repr(e)}')
+        return False
+    assign_seq_nos()
+    Logger.log_info(f'Read {len(statement_entries)} entries from SQLite file \'{file_name}\'')
+    Logger.log_info(f'Max sequence number: {seq_no}')
+    return True
 
-            Logger.log_info(f'Data saved to \'{filename}\'')
 
-    except FileNotFoundError:
-        Logger.log_error(f'Could not write to file {filename}')
+# -----------------------------------------------------
+# memory map a binary file and take the summaries from its footer, entries are
+# created from the file as they are used. sequence numbers are kept as saved
+# rather than renumbered, as that would mean creating every entry.
+# returns False if the file is not a binary file with summaries
+def read_lazy_file(file_name: str) -> bool:
+    global seq_no
+
+    try:
+        if SqliteFile.is_sqlite_file(file_name):
+            return read_lazy_sqlite_file(file_name)
+        with open(file_name, mode='rb') as f:
+            if not BinaryFile.is_binary_header(f.readline()[:-1]):
+                return False
+        store = LazyEntries.EntryStore(file_name)
+    except (FileNotFoundError, RuntimeError, ValueError):
+        # let read_file report the error
+        return False
+
+    columns = store.columns
+    if not BinaryFile.has_summaries(columns):
+        store.close()
         return False
+
+    seq_no = max(columns['seq_no'], default=-1)
+    set_lazy_entries(store,
+                     zip(columns['weekly_week_no'], columns['weekly_date'], columns['weekly_total'],
+                         columns['weekly_transactions'], columns['weekly_count']),
+                     zip(columns['monthly_date'], columns['monthly_total'],
+                         columns['monthly_transactions'], columns['monthly_count']))
+
+    Logger.log_info(f'Mapped {len(statement_entries)} entries from binary file \'{file_name}\'')
+    Logger.log_info(f'Max sequence number: {seq_no}')
+    return True
+
+
+# -----------------------------------------------------
+# open an SQLite file and take the summaries from GROUP BY queries, entries
+# are selected from the file as they are used, as read_lazy_file
+def read_lazy_sqlite_file(file_name: str) -> bool:
+    global seq_no
+
+    try:
+        store = LazyEntries.SqliteEntryStore(file_name)
+        weekly, monthly = SqliteFile.read_summaries(store.connection)
+        seq_no = SqliteFile.max_seq_no(store.connection)
+    except SqliteFile.sqlite3.Error:
+        # let read_file report the error
+        return False
+
+    # summary dates are the start of the week and of the month
+    set_lazy_entries(store,
+                     [(week_no, date - datetime.date.fromordinal(date).weekday(), total, transactions, count)
+                      for week_no, date, total, transactions, count in weekly],
+                     [(datetime.date(month // 12, month % 12 + 1, 1).toordinal(), total, transactions, count)
+                      for month, total, transactions, count in monthly])
+
+    Logger.log_info(f'Opened {len(statement_entries)} entries from SQLite file \'{file_name}\'')
+    Logger.log_info(f'Max sequence number: {seq_no}')
+    return True
+
+
+# -----------------------------------------------------
+# make the entries of a store statement_entries and set the summaries, each
+# summary covers the next count entries of the store. weekly are tuples
+# (week no, date ordinal, total, transactions, count) and monthly are tuples
+# (date ordinal, total, transactions, count)
+def set_lazy_entries(store, weekly, monthly) -> None:
+    global statement_entries
+    global statement_keys
+    global weekly_summaries
+    global monthly_summaries
+
+    statement_entries = LazyEntries.lazy_entry_list(store, 0, len(store))
+    added_entries.clear()
+    # building the dedup index would create every entry, duplicates are found
+    # by date instead, see find_equal_statement_entry
+    statement_keys = None
+
+    weekly_summaries = []
+    weekly_index.clear()
+    first = 0
+    for week_no, date, total, transactions, count in weekly:
+        summary = StatementData.StatementSummary(f'{week_no}', datetime.date.fromordinal(date),
+                                                 total, transactions)
+        summary.entries = LazyEntries.lazy_entry_list(store, first, count)
+        weekly_summaries.append(summary)
+        weekly_index[week_no] = summary
+        first += count
+
+    monthly_summaries = []
+    monthly_index.clear()
+    first = 0
+    for date, total, transactions, count in monthly:
+        date = datetime.date.fromordinal(date)
+        summary = StatementData.StatementSummary('{:02d}/{:04d}'.format(date.month, date.year), date,
+                                                 total, transactions)
+        summary.entries = LazyEntries.lazy_entry_list(store, first, count)
+        monthly_summaries.append(summary)
+        monthly_index[summary.summary_id] = summary
+        first += count
+
+    calculate_yearly_spend()
+    calculate_yearly_budget()
+
+
+# ------------------------------------------------------
+# assign sequence numbers in statement entries order
+def assign_seq_nos() -> None:
+    reset_seq_no()
+    for entry in statement_entries:
+        entry.seq_no = next_seq_no()
+
+
+# ------------------------------------------------------
+# replace statement_entries with a list of entries in any order,
+# the first of any duplicates is kept as add_statement_entry would.
+# a stable sort keeps entries that compare equal in their original order
+def bulk_load_statement_entries(entries: []) -> None:
+    global statement_entries
+    global statement_keys
+    statement_entries = []
+    statement_keys = set()
+    added_entries.clear()
+
+    for entry in entries:
+        key = StatementData.dedup_key(entry)
+        if key not in statement_keys:
+            statement_keys.add(key)
+            statement_entries.append(entry)
+
+    statement_entries.sort(key=StatementData.sort_key)
+
+
+# ------------------------------------------------------
+# add many entries to statement_entries in one pass rather than adding each in
+# turn with add_statement_entry, both give the same entries. entries are in the
+# order they were read and get sequence numbers in that order, duplicates of
+# existing entries or of each other are dropped. the new entries are then
+# merged in with a stable sort of the existing and new entries
+# returns the entries added, they are also added to added_entries
+def merge_statement_entries(entries: []) -> list:
+    global statement_entries
+
+    if statement_keys is None:
+        # no dedup index when loaded lazily
+        added = []
+        for entry in entries:
+            entry.seq_no = next_seq_no()
+            entry.is_new = add_statement_entry(statement_entries, entry) != -1
+            if entry.is_new:
+                added.append(entry)
+        return added
+
+    added = []
+    for entry in entries:
+        entry.seq_no = next_seq_no()
+        key = StatementData.dedup_key(entry)
+        entry.is_new = key not in statement_keys
+        if entry.is_new:
+            statement_keys.add(key)
+            added.append(entry)
+
+    statement_entries = statement_entries + added
+    statement_entries.sort(key=StatementData.sort_key)
+
+    added_entries.extend(added)
+    return added
+
+
+# ------------------------------------------------------
+# save to file, as write_file. if the file is the one the database was loaded
+# from or last saved to then only the changes since are saved, appended to its
+# journal or for an SQLite file saved in place. otherwise, or once the journal
+# is long and compact is set, the whole file is written
+def save_file(filename: str, binary: bool = None, compact: bool = True) -> bool:
+    if journal_file is None or os.path.abspath(filename) != os.path.abspath(journal_file) or \
+            not os.path.exists(filename):
+        return write_file(filename, binary)
+    if SqliteFile.is_sqlite_name(filename):
+        return save_sqlite_file(filename)
+    if compact and is_compaction_due():
+        return write_file(filename, binary)
+    return append_journal(filename)
+
+
+# ------------------------------------------------------
+# is the journal, with the unsaved changes, long enough to be compacted into
+# the database file
+def is_compaction_due() -> bool:
+    return journal_file is not None and not SqliteFile.is_sqlite_name(journal_file) and \
+        journal_records + len(unsaved_entries) + len(unsaved_updates) > \
+        max(JOURNAL_RECORDS, len(statement_entries) // 10)
+
+
+# ------------------------------------------------------
+# write to file, as text or binary, or as SQLite if the file is named as an
+# SQLite file, see SqliteFile. binary None chooses binary for files named as
+# binary files, see BinaryFile. the file is written to a temporary file
+# which then replaces it, so the old file is left as it was if writing fails.
+# the file then holds every change so its journal is removed. when compacting,
+# the unsaved changes are appended to the journal first so a journal left
+# behind by a crash before it is removed replays to the new file's state
+def write_file (filename: str, binary: bool = None) -> bool:
+    global statement_entries
+    global journal_file
+    global journal_records
+
+    if binary is None:
+        binary = BinaryFile.is_binary_name(filename)
+
+    if journal_file is not None and os.path.abspath(filename) == os.path.abspath(journal_file) and \
+            os.path.exists(journal_name(filename)) and not append_journal(filename):
+        return False
+
+    # a memory mapped file has to be fully loaded before it can be overwritten
+    if isinstance(statement_entries, LazyEntries.LazyEntryList) and \
+            os.path.exists(filename) and os.path.samefile(filename, statement_entries.store.file_name):
+        statement_entries.store.detach()
+
+    temp_file = filename + '.tmp'
+    try:
+        if SqliteFile.is_sqlite_name(filename):
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            SqliteFile.write(temp_file, statement_entries)
+        elif binary:
+            with open(temp_file, mode='wb') as f:
+                BinaryFile.write(f, statement_entries, weekly_summaries, monthly_summaries)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            with open(temp_file, mode='w', encoding="utf-8") as f:
+                f.write("Money Reckoner 1.40\n")
+                for se in statement_entries:
+                    f.write(se.to_csv())
+                    f.write('\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+        os.replace(temp_file, filename)
+        if os.path.exists(journal_name(filename)):
+            os.remove(journal_name(filename))
+
+        journal_file = filename
+        journal_records = 0
+        unsaved_entries.clear()
+        unsaved_updates.clear()
+        Logger.log_info(f'Data saved to \'{filename}\'')
+        return True
+
+    except (OSError, SqliteFile.sqlite3.Error) as e:
+        Logger.log_error(f'Could not write to file {filename}: {repr(e)}')
     except RuntimeError as e:
         Logger.log_error(repr(e))
+
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+    return False
+
+
+# ------------------------------------------------------
+# the journal of a database file
+def journal_name(filename: str) -> str:
+    return filename + '.journal'
+
+
+# ------------------------------------------------------
+# append the unsaved changes to the journal of a database file, one line each,
+#
+#   A,<csv of an added entry>
+#   U,<csv of an entry whose inclusion or user exclusion changed>
+#
+# as in a version 1.40 file. the journal is synced before returning
+def append_journal(filename: str) -> bool:
+    global journal_records
+
+    records = [f'A,{entry.to_csv()}\n' for entry in unsaved_entries] + \
+              [f'U,{entry.to_csv()}\n' for entry in unsaved_updates.values()]
+    if len(records) == 0:
+        return True
+
+    journal = journal_name(filename)
+    try:
+        with open(journal, mode='a', encoding='utf-8', newline='') as f:
+            if f.tell() == 0:
+                f.write(JOURNAL_HEADER + '\n')
+            f.write(''.join(records))
+            f.flush()
+            os.fsync(f.fileno())
+    except OSError as e:
+        Logger.log_error(f'Could not write to file {journal}: {repr(e)}')
+        return False
+
+    journal_records += len(records)
+    unsaved_entries.clear()
+    unsaved_updates.clear()
+    Logger.log_info(f'{len(records)} changes saved to \'{journal}\'')
+    return True
+
+
+# ------------------------------------------------------
+# save the unsaved changes to an SQLite file in one transaction
+def save_sqlite_file(filename: str) -> bool:
+    try:
+        inserted = SqliteFile.save(filename, unsaved_entries, list(unsaved_updates.values()))
+    except SqliteFile.sqlite3.Error as e:
+        Logger.log_error(f'Could not write to file {filename}: {repr(e)}')
         return False
 
+    Logger.log_info(f'{inserted} entries added and {len(unsaved_updates)} updated in \'{filename}\'')
+    unsaved_entries.clear()
+    unsaved_updates.clear()
+    return True
+
+
+# ------------------------------------------------------
+# replay the journal of a database file into statement_entries and the
+# summaries, which are adjusted for each record rather than recalculated so a
+# lazily loaded file stays lazy. a record cut short by a crash while it was being
+# appended is dropped and cut from the journal, so the next append starts on
+# a new line. added entries that are already in the file are dropped as
+# duplicates, so a journal left behind by a crash during compaction is harmless
+# returns the number of records replayed
+def read_journal(filename: str) -> int:
+    journal = journal_name(filename)
+    try:
+        with open(journal, mode='r', encoding='utf-8', newline='') as f:
+            text = f.read()
+    except FileNotFoundError:
+        return 0
+
+    lines = text.split('\n')
+    partial = lines.pop()
+    if len(partial) > 0:
+        Logger.log_error(f'Dropped partial record at the end of \'{journal}\'')
+        os.truncate(journal, len(text.encode('utf-8')) - len(partial.encode('utf-8')))
+
+    if len(lines) == 0 or lines[0] != JOURNAL_HEADER:
+        # nothing was saved to it
+        Logger.log_error(f'Invalid header in \'{journal}\', it is ignored')
+        os.replace(journal, journal + '.bad')
+        return 0
+
+    added = []
+    updated = []
+    for n in range(1, len(lines)):
+        entry = StatementData.StatementEntry()
+        if lines[n][:2] in ('A,', 'U,') and entry.from_csv(lines[n][2:], 1.4):
+            (added if lines[n][0] == 'A' else updated).append(entry)
+        else:
+            Logger.log_error(f'Error parsing journal line ({n}) : \'{lines[n]}\'')
+
+    for entry in merge_statement_entries(added):
+        entry.is_new = False
+    # the added entries are already saved
+    update_summaries()
+    unsaved_entries.clear()
+
+    for update in updated:
+        n = find_equal_statement_entry(statement_entries, update)
+        if n != -1:
+            set_entry_inclusion(statement_entries[n], update.included_weekly, update.included_monthly,
+                                update.user_excluded)
+
+    Logger.log_info(f'Replayed {len(lines) - 1} records from \'{journal}\'')
+    return len(lines) - 1
+
+
+# ------------------------------------------------------
+# convert a text file to binary or a binary file to text, changes in the
+# journal of src are included and the summaries are regenerated so a binary
+# file gets a footer that matches its entries
+def convert_file(src: str, dst: str) -> bool:
+
+    try:
+        with open(src, mode='rb') as f:
+            binary = not BinaryFile.is_binary_header(f.readline()[:-1])
+    except FileNotFoundError:
+        Logger.log_error(f'Could not find file {src}')
+        return False
+
+    if not read_file(src):
+        return False
+    generate_weekly_summaries()
+    generate_monthly_summaries()
+    read_journal(src)
+    return write_file(dst, binary)
+
 
 # ------------------------------------------------------
 def generate_weekly_summaries() -> None:
     global weekly_summaries
     weekly_summaries = []
-    week_no = 0
-    summary = StatementData.StatementSummary()
+    weekly_index.clear()
+    week_no = None
+    summary = None
 
     for entry in statement_entries:
         if week_no != entry.week_no:
@@ -166,122 +699,272 @@ def generate_weekly_summaries() -> None:
             week_no = entry.week_no
 
             # add previous summary to summaries list
-            if len(summary.entries) > 0:
+            if summary is not None:
                 calculate_weekly_summary(summary)
-                weekly_summaries.append(summary)
 
             # start summary for the new week
-            summary = StatementData.StatementSummary()
-            summary.summary_id = entry.week_no_str
-
-            # set summary date to the start of the week
-            summary.summary_date = copy.copy(entry.date) - datetime.timedelta(days=entry.date.weekday())
+            summary = new_weekly_summary(entry)
+            weekly_summaries.append(summary)
 
-        # accumulate summary data
-        add_statement_entry(summary.entries, entry)
+        # accumulate summary data, statement entries are already in order
+        summary.entries.append(entry)
 
     # add final summary to summaries list
-    if len(summary.entries) > 0:
+    if summary is not None:
         calculate_weekly_summary(summary)
-        weekly_summaries.append(summary)
+
+
+# ------------------------------------------------------
+# create an empty weekly summary for the week of entry and add it to the index
+def new_weekly_summary(entry: StatementData.StatementEntry) -> StatementData.StatementSummary:
+    summary = StatementData.StatementSummary()
+    summary.summary_id = f'{entry.week_no}'
+
+    # set summary date to the start of the week
+    summary.summary_date = copy.copy(entry.date) - datetime.timedelta(days=entry.date.weekday())
+
+    weekly_index[entry.week_no] = summary
+    return summary
 
 
 # ------------------------------------------------------
 def calculate_weekly_summary(summary: StatementData.StatementSummary) -> None:
-    summary.total = 0
-    summary.transactions = 0
-    for entry in summary.entries:
-        if entry.included_weekly and not entry.user_excluded:
-            summary.total -= entry.amount
-            summary.transactions += 1
+    amounts = [entry.amount for entry in summary.entries if entry.included_weekly and not entry.user_excluded]
+    summary.total = -sum(amounts)
+    summary.transactions = len(amounts)
 
 
 # ------------------------------------------------------
 def generate_monthly_summaries() -> None:
     global monthly_summaries
     monthly_summaries = []
-    ms = ''
-    summary = StatementData.StatementSummary()
+    monthly_index.clear()
+    month = None
+    summary = None
 
     for entry in statement_entries:
-        if ms != entry.month_str:
+        date = entry.date
+        if month != (date.year, date.month):
 
             # new month
-            ms = entry.month_str
+            month = (date.year, date.month)
 
             # add previous summary to summaries list
-            if len(summary.entries) > 0:
+            if summary is not None:
                 calculate_monthly_summary(summary)
-                monthly_summaries.append(summary)
-
-            # start summary for the new ms
-            summary = StatementData.StatementSummary()
-            summary.summary_id = ms
 
-            # set summary date to the start of the week
-            summary.summary_date = datetime.date(entry.date.year, entry.date.month, 1)
+            # start summary for the new month
+            summary = new_monthly_summary(entry)
+            monthly_summaries.append(summary)
 
-        add_statement_entry(summary.entries, entry)
+        summary.entries.append(entry)
 
     # add final summary to summaries list
-    if len(summary.entries) > 0:
+    if summary is not None:
         calculate_monthly_summary(summary)
-        monthly_summaries.append(summary)
 
-    # calculate yearly budget so far
+    calculate_yearly_spend()
+    calculate_yearly_budget()
+
+
+# ------------------------------------------------------
+# create an empty monthly summary for the month of entry and add it to the index
+def new_monthly_summary(entry: StatementData.StatementEntry) -> StatementData.StatementSummary:
+    summary = StatementData.StatementSummary()
+    summary.summary_id = entry.month_str
+
+    # set summary date to the start of the month
+    summary.summary_date = datetime.date(entry.date.year, entry.date.month, 1)
+
+    monthly_index[summary.summary_id] = summary
+    return summary
+
+
+# ------------------------------------------------------
+# bring the summaries up to date with the entries added since they were
+# generated, only the weeks and months of the new entries are touched
+# returns the added entries
+def update_summaries() -> list:
+    global yearly_spend
+
+    new_month = False
+    for entry in added_entries:
+
+        # weekly summary
+        summary = weekly_index.get(entry.week_no)
+        if summary is None:
+            summary = new_weekly_summary(entry)
+            bisect.insort(weekly_summaries, summary, key=lambda s: s.summary_date)
+
+        if add_statement_entry(summary.entries, entry) != -1 and \
+                entry.included_weekly and not entry.user_excluded:
+            summary.total -= entry.amount
+            summary.transactions += 1
+
+        # monthly summary
+        summary = monthly_index.get(entry.month_str)
+        if summary is None:
+            summary = new_monthly_summary(entry)
+            bisect.insort(monthly_summaries, summary, key=lambda s: s.summary_date)
+            new_month = True
+
+        if add_statement_entry(summary.entries, entry) != -1 and \
+                entry.included_monthly and not entry.user_excluded:
+            summary.total -= entry.amount
+            summary.transactions += 1
+            if yearly_spend_start is None or summary.summary_date >= yearly_spend_start:
+                yearly_spend -= entry.amount
+
+    added = added_entries.copy()
+    added_entries.clear()
+    unsaved_entries.extend(added)
+
+    # a new month may start a new year
+    if new_month:
+        calculate_yearly_spend()
+
+    return added
+
+
+# ------------------------------------------------------
+# calculate yearly budget so far
+def calculate_yearly_budget() -> None:
     global yearly_budget
     now = datetime.date.today()
     if now.month >= 4:
         days = now - datetime.date(now.year, 4, 1)
     else:
         days = now - datetime.date(now.year - 1, 4, 1)
-    yearly_budget = 18000 * days.days / 365
+    yearly_budget = 1800000 * days.days // 365
 
 
 # ------------------------------------------------------
+# yearly spend is left to calculate_yearly_spend
 def calculate_monthly_summary(summary: StatementData.StatementSummary) -> None:
+    amounts = [entry.amount for entry in summary.entries if entry.included_monthly and not entry.user_excluded]
+    summary.total = -sum(amounts)
+    summary.transactions = len(amounts)
+
+
+# ------------------------------------------------------
+# yearly spend from the monthly summaries, the spend since the last april
+def calculate_yearly_spend() -> None:
     global yearly_spend
-    summary.total = 0
-    summary.transactions = 0
-    for entry in summary.entries:
-        if entry.included_monthly and not entry.user_excluded:
-            summary.total -= entry.amount
-            summary.transactions += 1
-    # reset yearly spend at beginning of april
-    if summary.summary_date.month == 4:
-        yearly_spend = 0
-    yearly_spend += summary.total
+    global yearly_spend_start
+    yearly_spend = 0
+    yearly_spend_start = None
+    for summary in monthly_summaries:
+        if summary.summary_date.month == 4:
+            yearly_spend = 0
+            yearly_spend_start = summary.summary_date
+        yearly_spend += summary.total
 
 
 # ------------------------------------------------------
-def clear_parsed_text():
+# set the parsed text, list of tuples (valid data: bool, text line: str)
+def set_parsed_text(parsed: list):
     global parsed_text
-    parsed_text = []
+    parsed_text = parsed
 
 
 # ------------------------------------------------------
-def add_parsed_line(contains_data: bool, line: str):
-    global parsed_text
-    parsed_text.append((contains_data, line))
+# apply the inclusion rules to all the statement entries, e.g. after the rules
+# have changed. the summaries and the yearly spend are adjusted for the entries
+# whose inclusion changed rather than recalculated
+# returns the entries whose inclusion changed
+def reclassify_all() -> list:
+
+    # entries not yet in the summaries are added with their current inclusion
+    update_summaries()
+
+    changed = []
+    for n, included_weekly, included_monthly in classify_changes():
+        entry = statement_entries[n]
+        changed.append(entry)
+        unsaved_updates[StatementData.dedup_key(entry)] = entry
+        set_entry_inclusion(entry, included_weekly, included_monthly, entry.user_excluded)
+
+    if len(changed) > 0:
+        set_dirty()
+    Logger.log_info(f'Reclassified {len(statement_entries)} entries, {len(changed)} changed')
+    return changed
 
 
 # ------------------------------------------------------
+# the entries whose inclusion the rules change, list of tuples (position in
+# statement_entries, included weekly, included monthly). the entries of a
+# lazily loaded file are classified from its columns, or by the database for
+# an SQLite file, so only the entries that change are created
+def classify_changes() -> list:
+    if isinstance(statement_entries, LazyEntries.LazyEntryList):
+        store = statement_entries.store
+        if isinstance(store, LazyEntries.SqliteEntryStore):
+            changed = store.changed_inclusion(Rules.classify_values)
+            if len(changed) == 0:
+                return []
+            # the store also has rows of entries added to the summaries' lists
+            positions = {row: n for n, row in enumerate(statement_entries.rows)}
+            return sorted((positions[row], weekly, monthly) for row, weekly, monthly in changed if row in positions)
+
+        amounts, types, flags, descriptions = store.entry_columns(statement_entries.rows)
+        weekly, monthly = Rules.classify_columns(amounts, types, descriptions)
+        was_weekly = [bool(f & BinaryFile.FLAG_INCLUDED_WEEKLY) for f in flags]
+        was_monthly = [bool(f & BinaryFile.FLAG_INCLUDED_MONTHLY) for f in flags]
+    else:
+        weekly, monthly = Rules.classify(statement_entries)
+        was_weekly = [entry.included_weekly for entry in statement_entries]
+        was_monthly = [entry.included_monthly for entry in statement_entries]
+
+    return [(n, included_weekly, included_monthly) for n, (included_weekly, included_monthly, w, m)
+            in enumerate(zip(weekly, monthly, was_weekly, was_monthly))
+            if included_weekly != w or included_monthly != m]
+
+
+# ------------------------------------------------------
+# toggle user exclusion of an entry, see set_entry_inclusion
 def update_user_excluded(entry: StatementData.StatementEntry):
+    set_entry_inclusion(entry, entry.included_weekly, entry.included_monthly, not entry.user_excluded)
+    unsaved_updates[StatementData.dedup_key(entry)] = entry
+    set_dirty()
+
+
+# ------------------------------------------------------
+# set the inclusion and user exclusion of an entry that is in the summaries,
+# the entry's week and month summaries and the yearly spend are adjusted by
+# the entry's amount rather than recalculated
+def set_entry_inclusion(entry: StatementData.StatementEntry, included_weekly: bool, included_monthly: bool,
+                        user_excluded: bool) -> None:
+    global yearly_spend
 
-    # toggle user exclusion
-    entry.user_excluded = not entry.user_excluded
+    # 1 if the entry now counts in a summary and did not before, -1 if it no longer counts
+    weekly = int(included_weekly and not user_excluded) - int(entry.included_weekly and not entry.user_excluded)
+    monthly = int(included_monthly and not user_excluded) - int(entry.included_monthly and not entry.user_excluded)
+
+    entry.included_weekly = included_weekly
+    entry.included_monthly = included_monthly
+    entry.user_excluded = user_excluded
 
     # update weekly summary
-    for summary in weekly_summaries:
-        if summary.summary_id == entry.week_no_str:
-            calculate_weekly_summary(summary)
-            break
+    summary = weekly_index.get(entry.week_no)
+    if summary is not None and weekly != 0:
+        summary.total -= weekly * entry.amount
+        summary.transactions += weekly
 
     # update monthly summary
-    for summary in monthly_summaries:
-        if summary.summary_id == entry.month_str:
-            calculate_monthly_summary(summary)
-            break
+    summary = monthly_index.get(entry.month_str)
+    if summary is not None and monthly != 0:
+        summary.total -= monthly * entry.amount
+        summary.transactions += monthly
+        if yearly_spend_start is None or summary.summary_date >= yearly_spend_start:
+            yearly_spend -= monthly * entry.amount
 
-    set_dirty()
 
+# ------------------------------------------------------
+if __name__ == "__main__":
+
+    if len(sys.argv) < 3:
+        print('usage: python Database.py source_file destination_file', file=sys.stderr)
+        sys.exit(1)
+
+    if not convert_file(sys.argv[1], sys.argv[2]):
+        sys.exit(1)
@@ -0,0 +1,102 @@
+import Parsers as Parsers
+import Database as Database
+import Logger as Logger
+import os as os
+import sys
+import time as time
+from pathlib import Path
+
+# -----------------------------------------------------------------------
+# statement text ingestion, from the clipboard while the GUI is running, see
+# Clipboard, or without the GUI from a drop directory or stdin, run from the
+# command line
+#
+#   python Ingest.py database_file [drop_directory]
+#
+# with no drop directory the statement text is read from stdin. the database
+# file is saved after each statement that adds new entries
+
+
+# -----------------------------------------------------------------------
+# parse statement text into the database and bring the summaries up to date
+# returns the entries added, empty if there were none
+def ingest_text(text: str) -> list:
+    with Database.lock:
+        if Parsers.parse_statement(text):
+            return Database.update_summaries()
+        return []
+
+
+# -----------------------------------------------------------------------
+# parse a statement file into the database a line at a time and bring the
+# summaries up to date
+# returns the entries added, empty if there were none
+def ingest_file(file_name: str) -> list:
+    with Database.lock:
+        with open(file_name, 'r', encoding='utf-8') as f:
+            if Parsers.parse_lines(Parsers.file_lines(f), keep_parsed=False):
+                return Database.update_summaries()
+        return []
+
+
+# -----------------------------------------------------------------------
+# ingest the files in a drop directory, each file is moved to the processed
+# sub directory once it has been read
+# returns the entries added
+def ingest_directory(path: str) -> list:
+    processed = Path(path) / 'processed'
+    added = []
+    for file in sorted(Path(path).iterdir()):
+        if not file.is_file():
+            continue
+
+        Logger.log_info(f'Ingesting {file}')
+        try:
+            added += ingest_file(str(file))
+        except (OSError, UnicodeDecodeError) as ex:
+            Logger.log_error(f'Could not read {file}: {repr(ex)}')
+            continue
+
+        processed.mkdir(exist_ok=True)
+        os.replace(file, processed / file.name)
+
+    return added
+
+
+# -----------------------------------------------------------------------
+# save the database if it has changed
+def save_database(file_name: str) -> None:
+    with Database.lock:
+        if Database.get_is_dirty():
+            Database.save_file(file_name)
+            Database.set_dirty(False)
+
+
+# -----------------------------------------------------------------------
+# watch a drop directory, checking it every interval seconds
+def watch_directory(file_name: str, path: str, interval: float = 1.0) -> None:
+    Logger.log_info(f'Watching {path}')
+    while True:
+        if len(ingest_directory(path)) > 0:
+            save_database(file_name)
+        time.sleep(interval)
+
+
+# -----------------------------------------------------------------------
+if __name__ == "__main__":
+
+    if len(sys.argv) < 2:
+        print('usage: python Ingest.py database_file [drop_directory]', file=sys.stderr)
+        sys.exit(1)
+
+    if not Database.load_database(sys.argv[1], lazy=True):
+        sys.exit(1)
+
+    if len(sys.argv) > 2:
+        try:
+            watch_directory(sys.argv[1], sys.argv[2])
+        except KeyboardInterrupt:
+            pass
+    else:
+        ingest_text(sys.stdin.read())
+        save_database(sys.argv[1])
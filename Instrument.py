@@ -0,0 +1,208 @@
+import Database as Database
+import Parsers as Parsers
+import Logger as Logger
+import collections as collections
+import cProfile as cProfile
+import pstats as pstats
+import functools as functools
+import threading as threading
+import time as time
+
+# -----------------------------------------------------------------------
+# opt-in timing of hot paths. enable replaces each target function with a
+# wrapper that counts its calls and times them, disable puts the functions
+# back, so when disabled there is no overhead at all. targets are tuples
+# (module or class, function name), calls from other modules and from
+# within the module both go through the wrapper as they look the function
+# up by name.
+#
+# the profiler runs cProfile over the GUI thread and writes a .prof file,
+# e.g. for snakeviz or pstats. cProfile only profiles the thread that starts
+# it, so work on other threads, such as Worker jobs, is run with run_profiled
+# and its profiles are merged into the file.
+
+CORE_TARGETS = [(Parsers, 'parse_statement'),
+                (Database, 'add_statement_entry'),
+                (Database, 'read_file'),
+                (Database, 'write_file'),
+                (Database, 'append_journal'),
+                (Database, 'generate_weekly_summaries'),
+                (Database, 'generate_monthly_summaries')]
+
+# durations kept for the recent average
+RECENT = 100
+
+
+# -----------------------------------------------------------------------
+# call statistics for a function, times are in seconds
+class CallStats:
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._calls = 0
+        self._total = 0.0
+        self._longest = 0.0
+        self._recent = collections.deque(maxlen=RECENT)
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def calls(self) -> int:
+        return self._calls
+
+    @property
+    def total(self) -> float:
+        return self._total
+
+    @property
+    def longest(self) -> float:
+        return self._longest
+
+    # average of the most recent calls
+    @property
+    def recent(self) -> float:
+        return sum(self._recent) / len(self._recent) if len(self._recent) > 0 else 0.0
+
+    def clear(self) -> None:
+        self._calls = 0
+        self._total = 0.0
+        self._longest = 0.0
+        self._recent.clear()
+
+    def add(self, seconds: float) -> None:
+        self._calls += 1
+        self._total += seconds
+        self._longest = max(self._longest, seconds)
+        self._recent.append(seconds)
+
+
+# statistics by function name, and the original functions by target while enabled
+stats: dict = {}
+originals: dict = {}
+lock = threading.Lock()
+
+profiler: cProfile.Profile = None
+
+# profiles of work run on other threads with run_profiled while profiling
+thread_profiles: list = []
+
+
+# -----------------------------------------------------------------------
+def is_enabled() -> bool:
+    return len(originals) > 0
+
+
+# -----------------------------------------------------------------------
+# start timing the target functions
+def enable(targets: list = CORE_TARGETS) -> None:
+    for owner, name in targets:
+        if (owner, name) in originals:
+            continue
+        function = getattr(owner, name)
+        originals[(owner, name)] = function
+        setattr(owner, name, timed(f'{owner.__name__}.{name}', function))
+
+
+# -----------------------------------------------------------------------
+# stop timing, the statistics are kept
+def disable() -> None:
+    for (owner, name), function in originals.items():
+        setattr(owner, name, function)
+    originals.clear()
+
+
+# -----------------------------------------------------------------------
+def reset() -> None:
+    with lock:
+        for call_stats in stats.values():
+            call_stats.clear()
+
+
+# -----------------------------------------------------------------------
+# wrap a function to time its calls
+def timed(name: str, function):
+    with lock:
+        call_stats = stats.setdefault(name, CallStats(name))
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            with lock:
+                call_stats.add(seconds)
+
+    return wrapper
+
+
+# -----------------------------------------------------------------------
+# statistics as lines of text, longest total time first
+def report() -> list:
+    with lock:
+        rows = sorted(stats.values(), key=lambda s: s.total, reverse=True)
+        lines = [f'{"function":<40} {"calls":>8} {"total ms":>10} {"mean ms":>9} {"recent ms":>9} {"max ms":>9}']
+        for s in rows:
+            mean = s.total / s.calls if s.calls > 0 else 0.0
+            lines.append(f'{s.name:<40} {s.calls:>8} {s.total * 1000:>10.1f} {mean * 1000:>9.3f} '
+                         f'{s.recent * 1000:>9.3f} {s.longest * 1000:>9.3f}')
+    return lines
+
+
+# -----------------------------------------------------------------------
+# write the statistics to the log
+def dump() -> None:
+    for line in report():
+        Logger.log_info(line)
+
+
+# -----------------------------------------------------------------------
+# profile the calling thread, and work run with run_profiled, until stop_profile
+def start_profile() -> None:
+    global profiler
+    if profiler is None:
+        with lock:
+            thread_profiles.clear()
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+
+# -----------------------------------------------------------------------
+# call job() on the calling thread, with its own profiler while profiling
+# returns the result of job
+def run_profiled(job):
+    if profiler is None:
+        return job()
+
+    job_profiler = cProfile.Profile()
+    try:
+        job_profiler.enable()
+    except ValueError:
+        # from python 3.12 one profiler sees every thread, so it is already profiled
+        return job()
+    try:
+        return job()
+    finally:
+        job_profiler.disable()
+        with lock:
+            thread_profiles.append(job_profiler)
+
+
+# -----------------------------------------------------------------------
+# stop profiling and write the profile, with the profiles of the work run
+# with run_profiled, to a .prof file
+def stop_profile(file_name: str) -> None:
+    global profiler
+    if profiler is not None:
+        profiler.disable()
+        profile_stats = pstats.Stats(profiler)
+        with lock:
+            for job_profiler in thread_profiles:
+                profile_stats.add(job_profiler)
+            thread_profiles.clear()
+        profile_stats.dump_stats(file_name)
+        profiler = None
+        Logger.log_info(f'Profile written to \'{file_name}\'')
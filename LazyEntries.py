@@ -0,0 +1,283 @@
+import StatementData as StatementData
+import BinaryFile as BinaryFile
+import SqliteFile as SqliteFile
+import collections.abc as abc
+import array as array
+import mmap as mmap
+
+# flags of the summaries an entry is included in
+INCLUDED_FLAGS = BinaryFile.FLAG_INCLUDED_WEEKLY | BinaryFile.FLAG_INCLUDED_MONTHLY
+
+
+# -----------------------------------------------------------------------
+# columns of the amounts, StatementEntryType values, flags and descriptions
+# of entries, as they are held in a binary file, see BinaryFile
+def entry_columns(entries: list) -> (list, list, list, list):
+    return ([entry.amount for entry in entries], [entry.type.value for entry in entries],
+            [SqliteFile.entry_flags(entry) for entry in entries], [entry.description for entry in entries])
+
+
+# -----------------------------------------------------------------------
+# statement entries in a memory mapped binary file, each entry is created
+# from the file the first time it is used and then kept, so every list
+# over the store sees the same entry objects
+class EntryStore:
+
+    def __init__(self, file_name: str) -> None:
+        self._file_name = file_name
+        self._file = open(file_name, mode='rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._columns = BinaryFile.read_columns(self._mmap)
+        except (RuntimeError, ValueError, OSError):
+            self._file.close()
+            raise
+        # created entries by row, rows after those in the file are entries added since
+        self._entries = [None] * BinaryFile.column_length(self._columns)
+        self._length = len(self._entries)
+
+    # -----------------------------------------------------------------------
+    # file name accessors
+    @property
+    def file_name(self) -> str:
+        return self._file_name
+
+    # -----------------------------------------------------------------------
+    # columns read from the file, None once the file is closed
+    @property
+    def columns(self) -> dict:
+        return self._columns
+
+    # -----------------------------------------------------------------------
+    # number of entries in the file
+    def __len__(self) -> int:
+        return self._length
+
+    # -----------------------------------------------------------------------
+    # get the entry in a row, creating it from the file if need be
+    def entry(self, row: int) -> StatementData.StatementEntry:
+        entry = self._entries[row]
+        if entry is None:
+            entry = BinaryFile.entry_from_columns(self._columns, row)
+            self._entries[row] = entry
+        return entry
+
+    # -----------------------------------------------------------------------
+    # add an entry that is not in the file
+    # returns its row
+    def add(self, entry: StatementData.StatementEntry) -> int:
+        self._entries.append(entry)
+        return len(self._entries) - 1
+
+    # -----------------------------------------------------------------------
+    # entry_columns of rows, read from the file's columns without creating
+    # entries. the entries created are used in place of the file as they may
+    # have changed, and for the rows after the file
+    def entry_columns(self, rows) -> (list, list, list, list):
+        columns = ([], [], [], [])
+        if self._columns is not None:
+            offsets = self._columns['description_offset'].tolist()
+            data = bytes(self._columns['description'])
+            if data.isascii():
+                # byte offsets are then character offsets
+                text = data.decode('ascii')
+                descriptions = [text[start:end] for start, end in zip(offsets, offsets[1:])]
+            else:
+                descriptions = [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+            columns = (self._columns['amount'].tolist(), self._columns['type'].tolist(),
+                       self._columns['flags'].tolist(), descriptions)
+
+        created = [row for row, entry in enumerate(self._entries) if entry is not None]
+        entries = [self._entries[row] for row in created]
+        for column, values in zip(columns, entry_columns(entries)):
+            # rows after the file follow on from its columns
+            column.extend([None] * (len(self._entries) - len(column)))
+            for row, value in zip(created, values):
+                column[row] = value
+
+        return tuple([column[row] for row in rows] for column in columns)
+
+    # -----------------------------------------------------------------------
+    # create all the remaining entries and close the file,
+    # needed before the file can be written to
+    def detach(self) -> None:
+        if self._columns is not None:
+            for row in range(self._length):
+                self.entry(row)
+            self.close()
+
+    # -----------------------------------------------------------------------
+    # close the file, entries not yet created can no longer be used
+    def close(self) -> None:
+        if self._columns is None:
+            return
+        for column in self._columns.values():
+            if isinstance(column, memoryview):
+                column.release()
+        self._columns = None
+        self._mmap.close()
+        self._file.close()
+
+
+# -----------------------------------------------------------------------
+# statement entries in an SQLite file, as EntryStore. the row ids of the
+# entries in order are read when the file is opened and each entry is
+# selected by its row id the first time it is used
+class SqliteEntryStore:
+
+    def __init__(self, file_name: str) -> None:
+        self._file_name = file_name
+        self._connection = SqliteFile.connect(file_name, read_only=True)
+        try:
+            self._row_ids = array.array('q', [row_id for row_id, in self._connection.execute(
+                'SELECT rowid FROM entries ORDER BY date, type, seq_no')])
+        except SqliteFile.sqlite3.Error:
+            self._connection.close()
+            raise
+        # created entries by row, rows after those in the file are entries added since
+        self._entries = [None] * len(self._row_ids)
+        self._length = len(self._entries)
+
+    # -----------------------------------------------------------------------
+    # file name accessors
+    @property
+    def file_name(self) -> str:
+        return self._file_name
+
+    # -----------------------------------------------------------------------
+    # connection to the file, None once the file is closed
+    @property
+    def connection(self) -> SqliteFile.sqlite3.Connection:
+        return self._connection
+
+    # -----------------------------------------------------------------------
+    # number of entries in the file
+    def __len__(self) -> int:
+        return self._length
+
+    # -----------------------------------------------------------------------
+    # get the entry in a row, selecting it from the file if need be
+    def entry(self, row: int) -> StatementData.StatementEntry:
+        entry = self._entries[row]
+        if entry is None:
+            entry = SqliteFile.entry_from_row(self._connection.execute(
+                f'SELECT {SqliteFile.COLUMNS} FROM entries WHERE rowid = ?', (self._row_ids[row],)).fetchone())
+            self._entries[row] = entry
+        return entry
+
+    # -----------------------------------------------------------------------
+    # add an entry that is not in the file
+    # returns its row
+    def add(self, entry: StatementData.StatementEntry) -> int:
+        self._entries.append(entry)
+        return len(self._entries) - 1
+
+    # -----------------------------------------------------------------------
+    # rows whose inclusion is changed by classify(amount, type value,
+    # description), which returns tuple (included weekly, included monthly).
+    # the entries in the file are classified by the database in one pass so
+    # none are created, the entries created are classified as they may have
+    # changed since they were read
+    # returns list of tuples (row, included weekly, included monthly) in row order
+    def changed_inclusion(self, classify) -> list:
+        changed = []
+        if self._connection is not None and len(self._row_ids) > 0:
+            def flags(amount: int, t: int, description: str) -> int:
+                weekly, monthly = classify(amount, t, description)
+                return (BinaryFile.FLAG_INCLUDED_WEEKLY if weekly else 0) | \
+                       (BinaryFile.FLAG_INCLUDED_MONTHLY if monthly else 0)
+            self._connection.create_function('classified_flags', 3, flags, deterministic=True)
+
+            # entries added to the file since it was opened are left out
+            rows = None
+            for row_id, f in self._connection.execute(
+                    'SELECT rowid, classified_flags(amount, type, description) FROM entries '
+                    f'WHERE rowid <= ? AND flags & {INCLUDED_FLAGS} != classified_flags(amount, type, description)',
+                    (max(self._row_ids),)):
+                if rows is None:
+                    rows = {row_id: row for row, row_id in enumerate(self._row_ids)}
+                row = rows[row_id]
+                if self._entries[row] is None:
+                    changed.append((row, bool(f & BinaryFile.FLAG_INCLUDED_WEEKLY),
+                                    bool(f & BinaryFile.FLAG_INCLUDED_MONTHLY)))
+
+        for row, entry in enumerate(self._entries):
+            if entry is not None:
+                weekly, monthly = classify(entry.amount, entry.type.value, entry.description)
+                if weekly != entry.included_weekly or monthly != entry.included_monthly:
+                    changed.append((row, weekly, monthly))
+
+        changed.sort()
+        return changed
+
+    # -----------------------------------------------------------------------
+    # create all the remaining entries and close the file, selecting them in one go
+    def detach(self) -> None:
+        if self._connection is not None:
+            rows = {row_id: n for n, row_id in enumerate(self._row_ids) if self._entries[n] is None}
+            for values in self._connection.execute(f'SELECT rowid, {SqliteFile.COLUMNS} FROM entries'):
+                n = rows.get(values[0])
+                if n is not None:
+                    self._entries[n] = SqliteFile.entry_from_row(values[1:])
+            self.close()
+
+    # -----------------------------------------------------------------------
+    # close the file, entries not yet created can no longer be used
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+# -----------------------------------------------------------------------
+# list of statement entries held as rows of an entry store, entries are only
+# created when they are read from the list
+class LazyEntryList(abc.MutableSequence):
+
+    def __init__(self, store: EntryStore, rows: array.array) -> None:
+        self._store = store
+        self._rows = rows
+
+    # -----------------------------------------------------------------------
+    # store accessors
+    @property
+    def store(self) -> EntryStore:
+        return self._store
+
+    # -----------------------------------------------------------------------
+    # rows of the store in the list
+    @property
+    def rows(self) -> array.array:
+        return self._rows
+
+    # -----------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [self._store.entry(row) for row in self._rows[n]]
+        return self._store.entry(self._rows[n])
+
+    def __setitem__(self, n, entry) -> None:
+        if isinstance(n, slice):
+            self._rows[n] = array.array(self._rows.typecode, [self._store.add(e) for e in entry])
+        else:
+            self._rows[n] = self._store.add(entry)
+
+    def __delitem__(self, n) -> None:
+        del self._rows[n]
+
+    def __iter__(self):
+        entry = self._store.entry
+        for row in self._rows:
+            yield entry(row)
+
+    def insert(self, n: int, entry: StatementData.StatementEntry) -> None:
+        self._rows.insert(n, self._store.add(entry))
+
+
+# -----------------------------------------------------------------------
+# list over rows first to first + count of a store
+def lazy_entry_list(store: EntryStore, first: int, count: int) -> LazyEntryList:
+    return LazyEntryList(store, array.array('q', range(first, first + count)))
@@ -0,0 +1,67 @@
+import Logger as Logger
+import tkinter as tk
+import collections as collections
+
+# -----------------------------------------------------------------------
+# log sink showing the messages in a list box, errors in red.
+#
+# messages are held in a ring buffer and added to the list box in batches by
+# a timer, so logging is cheap and can be done from any thread. if the buffer
+# fills before it is flushed the oldest messages are dropped
+class LogListbox:
+
+    # most messages waiting to be added to the list box
+    BUFFER_SIZE = 10000
+
+    # most lines kept in the list box, the oldest are removed
+    MAX_LINES = 5000
+
+    # flush interval, ms
+    FLUSH_INTERVAL = 200
+
+    def __init__(self, list_box: tk.Listbox) -> None:
+        self._list_box = list_box
+        # tuples (text, level)
+        self._buffer = collections.deque(maxlen=self.BUFFER_SIZE)
+        self._dropped = 0
+
+    # -----------------------------------------------------------------------
+    # make this the logger's sink and start the timer
+    def start(self) -> None:
+        Logger.set_sink(self.log, self.flush)
+        self._list_box.after(self.FLUSH_INTERVAL, self.on_timer)
+
+    # -----------------------------------------------------------------------
+    # any thread
+    def log(self, text: str, message_level: int) -> None:
+        if len(self._buffer) == self.BUFFER_SIZE:
+            self._dropped += 1
+        self._buffer.append((text, message_level))
+
+    # -----------------------------------------------------------------------
+    # add the waiting messages to the list box, GUI thread only
+    def flush(self) -> None:
+        if len(self._buffer) == 0:
+            return
+
+        messages = []
+        while len(self._buffer) > 0:
+            messages.append(self._buffer.popleft())
+        if self._dropped > 0:
+            messages.insert(0, (f'... {self._dropped} messages dropped', Logger.ERROR))
+            self._dropped = 0
+
+        first = self._list_box.size()
+        self._list_box.insert(tk.END, *[text for text, message_level in messages])
+        for n, (text, message_level) in enumerate(messages):
+            if message_level >= Logger.ERROR:
+                self._list_box.itemconfig(first + n, {'fg': 'red'})
+
+        n = self._list_box.size()
+        if n > self.MAX_LINES:
+            self._list_box.delete(0, n - self.MAX_LINES - 1)
+
+    # -----------------------------------------------------------------------
+    def on_timer(self) -> None:
+        self.flush()
+        self._list_box.after(self.FLUSH_INTERVAL, self.on_timer)
@@ -1,20 +1,79 @@
+import sys
 
-import tkinter as tk
-from tkinter import ttk
+# -----------------------------------------------------------------------
+# log messages go to a sink when there is one, e.g. the GUI's list box,
+# otherwise to a stream. by default info goes to stdout and errors to
+# stderr, set_log_stream or set_log_file sends all messages to one stream.
+#
+# the logger does not depend on tkinter, so the data and parsing modules can
+# be imported and run without a display. a sink is a function (text, level)
+# called for each message, from any thread, with a flush function if the sink
+# buffers messages
 
-list_box: tk.Listbox = None
+# levels, messages below the current level are dropped
+DEBUG = 10
+INFO = 20
+ERROR = 40
 
+level: int = INFO
 
-def set_logger_listbox(lb: tk.Listbox) -> None:
-    global list_box
-    list_box = lb
+sink = None
+sink_flush = None
+stream = None
+
+
+# -----------------------------------------------------------------------
+# send all messages to a sink, None for the stream
+def set_sink(new_sink, new_sink_flush=None) -> None:
+    global sink
+    global sink_flush
+    sink = new_sink
+    sink_flush = new_sink_flush
+
+
+def set_level(new_level: int) -> None:
+    global level
+    level = new_level
+
+
+# send all messages to a stream, None for stdout and stderr
+def set_log_stream(new_stream) -> None:
+    global stream
+    stream = new_stream
+
+
+# send all messages to a file, appended to
+def set_log_file(file_name: str) -> None:
+    set_log_stream(open(file_name, mode='a', encoding='utf-8', buffering=1))
+
+
+def log_debug(text: str) -> None:
+    if level <= DEBUG:
+        log(text, DEBUG)
 
 
 def log_info(text: str) -> None:
-    list_box.insert(tk.END, text)
+    if level <= INFO:
+        log(text, INFO)
 
 
 def log_error(text: str) -> None:
-    list_box.insert(tk.END, text)
-    n = list_box.size()
-    list_box.itemconfig(n - 1, {'fg': 'red'})
+    if level <= ERROR:
+        log(text, ERROR)
+
+
+def log(text: str, message_level: int) -> None:
+    if sink is not None:
+        sink(text, message_level)
+    elif stream is not None:
+        print(text, file=stream)
+    elif message_level >= ERROR:
+        print(text, file=sys.stderr)
+    else:
+        print(text)
+
+
+# pass on the messages the sink is holding
+def flush() -> None:
+    if sink_flush is not None:
+        sink_flush()
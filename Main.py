@@ -1,9 +1,17 @@
 
 
-import Parsers as Parsers
+import Ingest as Ingest
+import Rules as Rules
+import Instrument as Instrument
 import StatementData as StatementData
 import Logger as Logger
 import Database as Database
+import VirtualTree as VirtualTree
+import Worker as Worker
+import Clipboard as Clipboard
+import Checkpoint as Checkpoint
+import LogListbox as LogListbox
+import bisect as bisect
 import sys
 import tkinter as tk
 import os
@@ -64,6 +72,20 @@ def fixed_map(style: ttk.Style, option):
 # create the tree view
 # columns is a list of tuples, ['column_name', column_width]
 def create_tree(frame: tk.Frame, columns: list = []) -> ttk.Treeview:
+    return create_tree_and_scroll_bar(frame, columns)[0]
+
+
+# -----------------------------------------------------------------------
+# create a virtual tree view, see VirtualTree
+def create_virtual_tree(frame: tk.Frame, columns: list, count, row, iid) -> VirtualTree.VirtualTree:
+    tree, scroll_v = create_tree_and_scroll_bar(frame, columns)
+    return VirtualTree.VirtualTree(tree, scroll_v, count, row, iid)
+
+
+# -----------------------------------------------------------------------
+# create the tree view
+# returns the tree and its vertical scroll bar
+def create_tree_and_scroll_bar(frame: tk.Frame, columns: list = []) -> (ttk.Treeview, tk.Scrollbar):
 
     # horizontal and vertical scroll bar
     scroll_v = tk.Scrollbar(frame, orient=tk.VERTICAL)
@@ -91,7 +113,91 @@ def create_tree(frame: tk.Frame, columns: list = []) -> ttk.Treeview:
     tree.tag_configure('new', background='light green')
     tree.tag_configure('parsed', background='light green')
 
-    return tree
+    return tree, scroll_v
+
+
+# -----------------------------------------------------------------------
+# populate a summary tree with a row for each summary, the iid of a summary
+# row is its summary id. the entries in a summary are only inserted when the
+# summary is opened, see insert_summary_children
+def populate_summaries_tree(tree: ttk.Treeview, summaries: list, values) -> None:
+    tree.delete(*tree.get_children())
+    for summary in summaries:
+        insert_summary_row(tree, tk.END, summary, values)
+
+
+# -----------------------------------------------------------------------
+# insert a summary row at position n
+def insert_summary_row(tree: ttk.Treeview, n, summary: StatementData.StatementSummary, values) -> None:
+    iid = summary.summary_id
+    tree.insert('', n, iid=iid, values=values(summary), open=False, text='')
+    # placeholder child so the summary can be opened
+    tree.insert(iid, tk.END, iid=f'{iid}.', text='')
+
+
+# -----------------------------------------------------------------------
+# insert options for an entry row of a summary tree, the iid of an entry row
+# is '<summary id>.<seq no>'
+# included returns whether the entry is included in the summary
+def summary_child_row(entry: StatementData.StatementEntry, child_values, included) -> dict:
+    tags = ()
+    if not included(entry) or entry.user_excluded:
+        tags += ('excluded',)
+    if entry.is_new:
+        tags += ('new',)
+
+    return {'values': child_values(entry), 'tags': tags, 'text': entry.seq_no_str}
+
+
+# -----------------------------------------------------------------------
+# insert the entries of the summary being opened
+def insert_summary_children(tree: ttk.Treeview, summaries: list, child_values, included) -> None:
+    iid = tree.focus()
+    if not tree.exists(f'{iid}.'):
+        # not a summary or already populated
+        return
+
+    tree.delete(f'{iid}.')
+    for entry in summaries[tree.index(iid)].entries:
+        tree.insert(iid, tk.END, iid=f'{iid}.{entry.seq_no}', open=False,
+                    **summary_child_row(entry, child_values, included))
+
+
+# -----------------------------------------------------------------------
+# update a summary tree for an entry of summary that has been added or changed,
+# only the summary row and the entry row are touched
+def update_summaries_tree(tree: ttk.Treeview, summaries: list, summary: StatementData.StatementSummary,
+                          entry: StatementData.StatementEntry, added: bool,
+                          values, child_values, included) -> None:
+    iid = summary.summary_id
+    if not tree.exists(iid):
+        # new summary
+        n = bisect.bisect_left(summaries, summary.summary_date, key=lambda s: s.summary_date)
+        insert_summary_row(tree, n, summary, values)
+        return
+
+    tree.item(iid, values=values(summary))
+    if tree.exists(f'{iid}.'):
+        # entries not inserted yet
+        return
+
+    child = f'{iid}.{entry.seq_no}'
+    if added:
+        # entries are added in order, so the rows before this one are in the tree
+        n = Database.index_of_statement_entry(summary.entries, entry)
+        tree.insert(iid, n, iid=child, open=False, **summary_child_row(entry, child_values, included))
+    elif tree.exists(child):
+        tree.item(child, **summary_child_row(entry, child_values, included))
+
+
+# -----------------------------------------------------------------------
+# statement entry for an entry row of a summary tree, None for a summary row,
+# summary and entry rows are in the same order as summaries and their entries
+def entry_of_summary_item(tree: ttk.Treeview, iid: str, summaries: list) -> StatementData.StatementEntry:
+    parent = tree.parent(iid)
+    if len(parent) == 0 or iid == f'{parent}.':
+        return None
+    return summaries[tree.index(parent)].entries[tree.index(iid)]
 
 
 # -----------------------------------------------------------------------
@@ -99,14 +205,20 @@ def create_tree(frame: tk.Frame, columns: list = []) -> ttk.Treeview:
 
 class Main:
 
+    # most changed entries for which tree rows are updated rather than the trees repopulated
+    MAX_UPDATE_ROWS = 1000
+
     def __init__(self):
         self._window = None
+        self._view_all = None
         self._tree_all = None
         self._tree_weekly = None
         self._tree_monthly = None
         self._tree_parsed_text = None
         self._tabs = None
-        self._clipboard = ''
+        self._clipboard = None
+        self._worker = None
+        self._checkpointer = None
 
         if os.name == 'posix':
             self._filename = '/media/e/Data/_Ricks/Python/Starter5/statement.txt'
@@ -116,105 +228,134 @@ class Main:
             self._filename = ''
 
     # -----------------------------------------------------------------------
-    # clipboard handler
-    def on_timer(self) -> None:
-        try:
-            cb = self._window.clipboard_get()
-            if cb != self._clipboard:
-                self._clipboard = cb
-                if Parsers.parse_statement(cb):
-                    Database.generate_weekly_summaries()
-                    Database.generate_monthly_summaries()
-                    self.populate_all_entries_tree()
-                    self.populate_weekly_summaries_tree()
-                    self.populate_monthly_summaries_tree()
-                    self.populate_parsed_text_tree()
-                    self.log_yearly_spend()
-
-        except tk.TclError as ex:
-            # clipboard was empty
-            pass
+    # clipboard handler, called by the clipboard watcher with new clipboard text,
+    # the text is parsed on the worker thread
+    def on_clipboard(self, text: str) -> None:
+        self._worker.submit(lambda: Ingest.ingest_text(text), self.on_ingested)
 
-        self._window.after(1000, self.on_timer)
+    # -----------------------------------------------------------------------
+    # clipboard text has been parsed, added is the entries added or None if parsing failed
+    def on_ingested(self, added: list) -> None:
+        if added is None:
+            # the database may be part way through an update, show all of it
+            self.on_loaded(None)
+            return
+
+        if len(added) > 0:
+            self.update_trees(added, True)
+            self.populate_parsed_text_tree()
+            self.log_yearly_spend()
+        self._view_all.thaw()
+        self.compact_if_due()
+
+    # -----------------------------------------------------------------------
+    # a worker job is starting, the trees must not read the database until it is done
+    def on_worker_start(self) -> None:
+        self._view_all.freeze()
+
+    # -----------------------------------------------------------------------
+    # fold a long journal into the database file. writing the whole file closes
+    # a lazily loaded file, so it is done by the worker with the views frozen
+    def compact_if_due(self) -> None:
+        if Database.is_compaction_due():
+            self._worker.submit(Checkpoint.compact, self.on_compacted)
+
+    def on_compacted(self, result) -> None:
+        self._view_all.thaw()
+
+    # -----------------------------------------------------------------------
+    # is a worker job running, the database can not be used by the trees if so
+    def is_busy(self) -> bool:
+        if self._worker.busy:
+            Logger.log_info('Busy, try again when the statement has been read')
+            return True
+        return False
 
     # -----------------------------------------------------------------------
-    # window closing
+    # window closing, changes are saved as they are made by the checkpointer
+    # so only the last few are left to save. waits for any worker job
     def on_close(self):
-        if Database.get_is_dirty():
-            res = mb.askyesno('Exit', f'Do you want to save to \'{self._filename}\'')
-            if res:
-                Database.write_file(self._filename)
+        if not Checkpoint.checkpoint():
+            res = mb.askyesno('Exit', f'Could not save to \'{self._filename}\', exit anyway?')
+            if not res:
+                return
         self._window.destroy()
 
     # -----------------------------------------------------------------------
     # populate weekly summary tree
     def log_yearly_spend(self) -> None:
         Logger.log_info(
-            f'Spend £{Database.yearly_spend:,.2f}, Budget £{Database.yearly_budget:,.2f}')
+            f'Spend {StatementData.money_str(Database.yearly_spend)}, '
+            f'Budget {StatementData.money_str(Database.yearly_budget)}')
         Logger.log_info(
-            f'Underspend £{Database.yearly_budget - Database.yearly_spend:,.2f} ({Database.yearly_spend * 100 / Database.yearly_budget:.0f}%)')
+            f'Underspend {StatementData.money_str(Database.yearly_budget - Database.yearly_spend)} '
+            f'({Database.yearly_spend * 100 / Database.yearly_budget:.0f}%)')
 
     # -----------------------------------------------------------------------
-    # populate weekly summary tree
+    # populate all entries tree, only the rows in view are inserted
     def populate_all_entries_tree(self) -> None:
-        # clear tree
-        self._tree_all.delete(*self._tree_all.get_children())
-        # for entry in Database.statement_entries:
-        for entry in Database.statement_entries:
-            tags = ()
-            if entry.is_new:
-                tags += ('new',)
+        self._view_all.refresh()
+
+    # -----------------------------------------------------------------------
+    # insert options for row n of the all entries tree
+    def row_all_entries_tree(self, n: int) -> dict:
+        entry = Database.statement_entries[n]
+        tags = ()
+        if entry.is_new:
+            tags += ('new',)
 
-            # store index into data collection as text attribute
-            self._tree_all.insert('', tk.END, values=values_all_tree(entry), open=False, tags=tags,
-                                  text=f'{entry.lookup}')
+        return {'values': values_all_tree(entry), 'tags': tags, 'text': entry.seq_no_str}
+
+    # -----------------------------------------------------------------------
+    # tree item id for row n of the all entries tree
+    def iid_all_entries_tree(self, n: int) -> str:
+        return Database.statement_entries[n].seq_no_str
+
+    # -----------------------------------------------------------------------
+    # update the trees for entries that have been added or changed, only the
+    # rows for the entries and their summaries are touched
+    def update_trees(self, entries: list, added: bool) -> None:
+        rows = [Database.index_of_statement_entry(Database.statement_entries, entry) for entry in entries]
+        for n in sorted(rows):
+            if added:
+                self._view_all.insert_row(n)
+            else:
+                self._view_all.update_row(n)
+
+        # in order, so each entry row goes in after the rows before it are there
+        for entry in sorted(entries, key=StatementData.sort_key):
+            update_summaries_tree(self._tree_weekly, Database.weekly_summaries,
+                                  Database.weekly_index[entry.week_no], entry, added,
+                                  values_summary_weekly_tree, child_values_summary_weekly_tree,
+                                  lambda e: e.included_weekly)
+            update_summaries_tree(self._tree_monthly, Database.monthly_summaries,
+                                  Database.monthly_index[entry.month_str], entry, added,
+                                  values_summary_monthly_tree, child_values_summary_monthly_tree,
+                                  lambda e: e.included_monthly)
 
     # -----------------------------------------------------------------------
     # populate weekly summary tree
     def populate_weekly_summaries_tree(self) -> None:
-        self._tree_weekly.delete(*self._tree_weekly.get_children())
-        iid = 0
-        for summary in Database.weekly_summaries:
-            self._tree_weekly.insert('', tk.END, iid=iid, values=values_summary_weekly_tree(summary),
-                                     open=False, text='')
-            piid = iid
-            iid += 1
-
-            # for entry in Database.summary.entries:
-            for entry in summary.entries:
-                tags = ()
-                if not entry.included_weekly or entry.user_excluded:
-                    tags += ('excluded',)
-                if entry.is_new:
-                    tags += ('new',)
-
-                self._tree_weekly.insert('', tk.END, iid=iid, values=child_values_summary_weekly_tree(entry),
-                                         open=False, tags=tags, text=f'{entry.lookup}')
-                self._tree_weekly.move(iid, piid, iid - piid)
-                iid += 1
+        populate_summaries_tree(self._tree_weekly, Database.weekly_summaries, values_summary_weekly_tree)
+
+    def on_weekly_open(self, event) -> None:
+        if self.is_busy():
+            self._tree_weekly.item(self._tree_weekly.focus(), open=False)
+            return
+        insert_summary_children(self._tree_weekly, Database.weekly_summaries, child_values_summary_weekly_tree,
+                                lambda entry: entry.included_weekly)
 
     # -----------------------------------------------------------------------
-    # populate weekly summary tree
+    # populate monthly summary tree
     def populate_monthly_summaries_tree(self) -> None:
-        self._tree_monthly.delete(*self._tree_monthly.get_children())
-        iid = 0
-        for summary in Database.monthly_summaries:
-            self._tree_monthly.insert('', tk.END, iid=iid, values=values_summary_monthly_tree(summary), open=False,
-                                      text='')
-            piid = iid
-            iid += 1
-
-            for entry in summary.entries:
-                tags = ()
-                if not entry.included_monthly or entry.user_excluded:
-                    tags += ('excluded',)
-                if entry.is_new:
-                    tags += ('new',)
-
-                self._tree_monthly.insert('', tk.END, iid=iid, values=child_values_summary_monthly_tree(entry),
-                                          open=False, tags=tags, text=f'{entry.lookup}')
-                self._tree_monthly.move(iid, piid, iid - piid)
-                iid += 1
+        populate_summaries_tree(self._tree_monthly, Database.monthly_summaries, values_summary_monthly_tree)
+
+    def on_monthly_open(self, event) -> None:
+        if self.is_busy():
+            self._tree_monthly.item(self._tree_monthly.focus(), open=False)
+            return
+        insert_summary_children(self._tree_monthly, Database.monthly_summaries, child_values_summary_monthly_tree,
+                                lambda entry: entry.included_monthly)
 
     # -----------------------------------------------------------------------
     # populate weekly summary tree
@@ -230,7 +371,7 @@ class Main:
     # -----------------------------------------------------------------------
 
     def on_exit(self):
-        self._window.destroy()
+        self.on_close()
 
     # -----------------------------------------------------------------------
 
@@ -241,13 +382,15 @@ class Main:
                                   title="Select file to save to",
                                   initialfile=path.name,
                                   initialdir=path.parent,
-                                  filetypes=(('text files', '*.txt'), ('all files', '*.*')))
+                                  filetypes=(('text files', '*.txt'), ('binary files', '*.mrb'),
+                                             ('SQLite files', '*.db *.sqlite'), ('all files', '*.*')))
 
         if len(fn) > 0:
-            # save file
+            # save file, binary or SQLite if it has their extension
             self._filename = fn
-            Database.write_file(fn)
-            Database.set_dirty(False)
+            with Database.lock:
+                Database.save_file(fn)
+                Database.set_dirty(False)
 
     # -----------------------------------------------------------------------
 
@@ -258,57 +401,117 @@ class Main:
                                 title="Select a file to load",
                                 initialfile=path.name,
                                 initialdir=path.parent,
-                                filetypes=(('text files', '*.txt'), ('all files', '*.*')))
+                                filetypes=(('text files', '*.txt'), ('binary files', '*.mrb'),
+                                           ('SQLite files', '*.db *.sqlite'), ('all files', '*.*')))
 
         if len(fn) > 0:
-            # load file
+            # save the changes made since the last checkpoint, loading drops them
+            if self.is_busy():
+                return
+            if not Checkpoint.checkpoint():
+                res = mb.askyesno('Open', f'Could not save to \'{self._filename}\', open anyway?')
+                if not res:
+                    return
+
+            # load file on the worker thread
             self._filename = fn
-            Database.load_database(fn)
-            self.populate_all_entries_tree()
-            self.populate_weekly_summaries_tree()
-            self.populate_monthly_summaries_tree()
+            self._worker.submit(lambda: Database.load_database(fn, lazy=True), self.on_loaded)
+
+    # -----------------------------------------------------------------------
+    # a file has been loaded, result is False if it could not be read
+    def on_loaded(self, result) -> None:
+        self._view_all.thaw()
+        if result is False:
+            self.show_load_error()
+        self.populate_all_entries_tree()
+        self.populate_weekly_summaries_tree()
+        self.populate_monthly_summaries_tree()
+        self.log_yearly_spend()
+
+    # -----------------------------------------------------------------------
+    # the file could not be read, changes are not saved to it unless it is
+    # chosen with save, which would overwrite it
+    def show_load_error(self) -> None:
+        mb.showerror('Open', f'Could not read \'{self._filename}\', see the log. '
+                             'Changes will not be saved to it.')
+
+    # -----------------------------------------------------------------------
+    # log the instrumentation timings
+    def on_show_timings(self) -> None:
+        if Instrument.is_enabled():
+            Instrument.dump()
+        else:
+            Logger.log_info('Timings are not enabled, run with --instrument')
+
+    # -----------------------------------------------------------------------
+    # reload the inclusion rules and apply them to all entries on the worker thread
+    def on_reload_rules(self) -> None:
+        self._worker.submit(lambda: Rules.load_rules(Rules.RULES_FILE) and Database.reclassify_all(),
+                            self.on_reclassified)
+
+    # -----------------------------------------------------------------------
+    # entries have been reclassified, changed is the entries whose inclusion changed
+    def on_reclassified(self, changed) -> None:
+        if not changed:
+            # rules not read or nothing changed
+            self._view_all.thaw()
+            return
+
+        Logger.log_info(f'{len(changed)} entries changed inclusion')
+        if len(changed) > self.MAX_UPDATE_ROWS:
+            # quicker to repopulate
+            self.on_loaded(None)
+        else:
+            self.update_trees(changed, False)
             self.log_yearly_spend()
+            self._view_all.thaw()
+        self.compact_if_due()
 
     def on_toggle_exclude_entry(self):
 
+        if self.is_busy():
+            return
+
         try:
             # get selected tab
             st = self._tabs.tab(self._tabs.select(), "text")
             Logger.log_info(f'tab {st}')
 
             tree = None
+            summaries = None
             if st == 'All':
                 tree = self._tree_all
             elif st == 'Weekly':
                 tree = self._tree_weekly
+                summaries = Database.weekly_summaries
             elif st == 'Monthly':
                 tree = self._tree_monthly
+                summaries = Database.monthly_summaries
             else:
                 return
 
-            # get selected item for tree
+            # get selected items for tree
             sel_items = tree.selection()
+            toggled = []
 
-            if len(sel_items) > 0:
-                # get index to Database.statement_entries collection
-                item = sel_items[0]
-                # get text attribute which will be the index of the selected
-                # item in Database.statement_entries
-                ixs = tree.item(item, "text")
-                if len(ixs) > 0:
-
-                    # get statement entry
-                    ix = int(ixs)
-                    entry = Database.statement_entries[ix]
+            for item in sel_items:
+                # get statement entry from the item
+                if summaries is None:
+                    entry = Database.statement_entries[self._view_all.row_of(item)]
+                else:
+                    entry = entry_of_summary_item(tree, item, summaries)
+                if entry is not None:
 
                     # update user_excluded
-                    Database.update_user_excluded(entry)
+                    with Database.lock:
+                        Database.update_user_excluded(entry)
+                    toggled.append(entry)
 
-                    # refresh trees
-                    self.populate_all_entries_tree()
-                    self.populate_weekly_summaries_tree()
-                    self.populate_monthly_summaries_tree()
-                    self.log_yearly_spend()
+            if len(toggled) > 0:
+                # refresh the toggled rows
+                self.update_trees(toggled, False)
+                self.log_yearly_spend()
+                self.compact_if_due()
 
         except AttributeError:
             Logger.log_info('No tab selected')
@@ -345,6 +548,8 @@ class Main:
         menu_bar.add_cascade(label='Edit', menu=edit_menu)
 
         edit_menu.add_command(label='Toggle exclude entry', command=self.on_toggle_exclude_entry)
+        edit_menu.add_command(label='Reload rules', command=self.on_reload_rules)
+        edit_menu.add_command(label='Show timings', command=self.on_show_timings)
 
         # splitter
         paned_window = ttk.Panedwindow(self._window, orient=tk.HORIZONTAL)
@@ -394,16 +599,17 @@ class Main:
         logger_scroll.config(command=logger.yview)
     
         # initialise logger
-        Logger.set_logger_listbox(logger)
+        LogListbox.LogListbox(logger).start()
     
         Logger.log_info(f'Python version {sys.version_info[0]}.{sys.version_info[1]}')
 
         # workout current directory
-        Logger.log_info(f'sys.path {sys.path}')
-        Logger.log_info(f'sys.executable {sys.executable}')
+        Logger.log_debug(f'sys.path {sys.path}')
+        Logger.log_debug(f'sys.executable {sys.executable}')
 
         # read the statement entries from file
-        Database.load_database(self._filename)
+        if not Database.load_database(self._filename, lazy=True):
+            self.show_load_error()
 
         # all entries tree
         columns = [['type',        'Type',         160],
@@ -415,7 +621,9 @@ class Main:
                    ['included',    'Included',      40],
                    ['seq_no',      'Seq',           40]]
     
-        self._tree_all = create_tree(tab_all, columns)
+        self._view_all = create_virtual_tree(tab_all, columns, lambda: len(Database.statement_entries),
+                                             self.row_all_entries_tree, self.iid_all_entries_tree)
+        self._tree_all = self._view_all.tree
         self.populate_all_entries_tree()
     
         # weekly summary tree view
@@ -432,6 +640,7 @@ class Main:
                    ['seq_no',       'Seq',           40]]
     
         self._tree_weekly = create_tree(tab_weekly, columns)
+        self._tree_weekly.bind('<<TreeviewOpen>>', self.on_weekly_open)
         self.populate_weekly_summaries_tree()
     
         # monthly summary tree view
@@ -447,6 +656,7 @@ class Main:
                    ['seq_no',       'Seq',           40]]
     
         self._tree_monthly = create_tree(tab_monthly, columns)
+        self._tree_monthly.bind('<<TreeviewOpen>>', self.on_monthly_open)
         self.populate_monthly_summaries_tree()
         self.log_yearly_spend()
 
@@ -456,19 +666,48 @@ class Main:
         self._tree_parsed_text = create_tree(tab_parsed_text, columns)
 
         # start the timer
-        self._window.after(1000, self.on_timer)
+        self._worker = Worker.Worker(self._window, self.on_worker_start)
+        self._clipboard = Clipboard.ClipboardWatcher(self._window, self.on_clipboard)
+        self._clipboard.start()
+        self._checkpointer = Checkpoint.Checkpointer()
+        self._checkpointer.start()
 
         self._window.protocol("WM_DELETE_WINDOW", self.on_close)
         self._window.mainloop()
+
+        # let a checkpoint in progress finish
+        self._checkpointer.stop()
     
 
 # -----------------------------------------------------------------------
 # main
+# -----------------------------------------------------------------------
+# run from the command line
+#
+#   python Main.py [--instrument] [--profile file.prof]
+#
+# --instrument times the hot paths, see Edit/Show timings,
+# --profile runs the session under cProfile and writes file.prof on exit
 if __name__ == "__main__":
 
+    if '--instrument' in sys.argv:
+        Instrument.enable(Instrument.CORE_TARGETS +
+                          [(Main, 'populate_all_entries_tree'),
+                           (Main, 'populate_weekly_summaries_tree'),
+                           (Main, 'populate_monthly_summaries_tree'),
+                           (Main, 'populate_parsed_text_tree')])
+
+    profile = None
+    if '--profile' in sys.argv and sys.argv.index('--profile') + 1 < len(sys.argv):
+        profile = sys.argv[sys.argv.index('--profile') + 1]
+        Instrument.start_profile()
+
     ui = Main()
     ui.run()
 
+    if profile is not None:
+        Instrument.stop_profile(profile)
+
 
 
 
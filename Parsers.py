@@ -2,64 +2,210 @@
 import Logger as Logger
 import Database as Database
 import StatementData as StatementData
+import Rules as Rules
 import datetime as datetime
-import locale as locale
+import collections as collections
+import itertools as itertools
 import os
+import re as re
 from enum import Enum
 
 
 def parse_statement(s: str) -> bool:
     # returns true if new entries have been added to the database
+    return parse_lines(split_lines(s))
 
-    lines = s.split('\n')
-    new_data = False
 
-    for line in lines:
-        # if line.__contains__('09-01-28 43377166 - 123 CURRENT ACCOUNT'):
-        if line.__contains__('1|2|3 Current Account earnings'):
-            new_data = parse_santander_current_account_statement(lines)
-            break
-        # if line.__contains__('xxxx xxxx xxxx 3878 - SANTANDER 1 2 3 CASHBACK CARD'):
-        if line.__contains__('1|2|3 Credit Card earnings'):
-            new_data = parse_santander_credit_card_statement(lines)
-            break
-        if line.__contains__('CashPlus Online Banking'):
-            new_data = parse_cash_plus_statement(lines)
-            break
+# parse statement lines from any iterable of lines, e.g. file_lines of a file,
+# the lines are read once, in order. keep_parsed keeps the lines in
+# Database.parsed_text, for large files it can be turned off
+# returns true if new entries have been added to the database
+def parse_lines(lines, keep_parsed: bool = True) -> bool:
 
-    if new_data:
+    # a deque of no length throws away what is appended to it
+    parsed = [] if keep_parsed else collections.deque(maxlen=0)
+    statement = read_statement(lines, parsed)
+    if statement is None:
+        return False
+
+    name, entries = statement
+    if keep_parsed:
+        Database.set_parsed_text(parsed)
+    new_count = add_entries(entries)
+    Logger.log_info(f'Parsed {name}, {new_count} of {len(entries)} entries are new')
+
+    if new_count > 0:
         Database.set_dirty()
         return True
     else:
         return False
 
 
+# the lines of a string, as s.split('\n') but one at a time
+def split_lines(s: str):
+    start = 0
+    end = s.find('\n')
+    while end != -1:
+        yield s[start:end]
+        start = end + 1
+        end = s.find('\n', start)
+    yield s[start:]
+
+
+# the lines of an open text file without their line ends
+def file_lines(f):
+    for line in f:
+        yield line[:-1] if line.endswith('\n') else line
+
+
+# read the entries from statement lines without adding them to the database,
+# parsed is appended with tuples (valid data: bool, text line: str)
+# returns tuple (statement name, list of entries), None if the statement is not recognised
+def read_statement(lines, parsed) -> (str, list):
+
+    # find the format from its marker, one search of each line for all the markers
+    lines = iter(lines)
+    head = []
+    statement_format = None
+    for line in lines:
+        head.append(line)
+        statement_format = find_statement_format(line)
+        if statement_format is not None:
+            break
+
+    if statement_format is None:
+        return None
+
+    # the lines up to and including the header are not data, the header
+    # may come before the marker
+    lines = itertools.chain(head, lines)
+    for line in lines:
+        parsed.append((False, line))
+        if statement_format.header.fullmatch(line) is not None:
+            return statement_format.name, statement_format.read(lines, parsed)
+
+    return statement_format.name, []
+
+
+# read the entries from a statement text file, for use by a process pool,
+# the file is read a line at a time
+# returns the list of entries, empty if the statement is not recognised
+def read_statement_file(file_name: str) -> list:
+    try:
+        with open(file_name, mode='r', encoding='utf-8') as f:
+            statement = read_statement(file_lines(f), collections.deque(maxlen=0))
+    except (OSError, UnicodeDecodeError) as ex:
+        Logger.log_error(f'Could not read \'{file_name}\': {repr(ex)}')
+        return []
+    if statement is None:
+        Logger.log_error(f'Statement not recognised in file \'{file_name}\'')
+        return []
+    return statement[1]
+
+
+# add entries read from a statement to the database in the order they were read,
+# entries already in the database are not added
+# returns the number of new entries
+def add_entries(entries: list) -> int:
+    new_count = 0
+    for entry in entries:
+        entry.seq_no = Database.next_seq_no()
+
+        entry.is_new = Database.add_statement_entry(Database.statement_entries, entry) != -1
+        if entry.is_new:
+            new_count += 1
+
+    return new_count
+
+
+# -----------------------------------------------------------------------
+# a statement format, statements are recognised by any of the marker strings
+# appearing in a line and their data starts after the line matching header.
+# read(lines, parsed) reads the entries from the lines after the header
+class StatementFormat:
+
+    def __init__(self, name: str, markers: list, header: re.Pattern, read) -> None:
+        self._name = name
+        self._markers = markers
+        self._header = header
+        self._read = read
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def markers(self) -> list:
+        return self._markers
+
+    @property
+    def header(self) -> re.Pattern:
+        return self._header
+
+    @property
+    def read(self):
+        return self._read
+
+
+# registered statement formats, and a regex matching any of their markers
+# with a group for each format, named f<index in statement_formats>
+statement_formats: list = []
+markers_regex: re.Pattern = re.compile('(?!)')
+
+# regex matching the markers of each format, in statement_formats order
+format_regexes: list = []
+
+
+def markers_pattern(statement_format: StatementFormat) -> str:
+    return '|'.join(re.escape(marker) for marker in statement_format.markers)
+
+
+# add a statement format, formats registered first win if a line has markers of more than one
+def register_statement_format(statement_format: StatementFormat) -> None:
+    global markers_regex
+    statement_formats.append(statement_format)
+    format_regexes.append(re.compile(markers_pattern(statement_format)))
+    markers_regex = re.compile('|'.join(
+        f'(?P<f{n}>{markers_pattern(f)})' for n, f in enumerate(statement_formats)))
+
+
+# the format whose marker is in line, None if there is none.
+# the combined regex finds the leftmost marker, so the formats registered
+# before it are checked for a marker anywhere in the line
+def find_statement_format(line: str) -> StatementFormat:
+    match = markers_regex.search(line)
+    if match is None:
+        return None
+    n = int(match.lastgroup[1:])
+    for m in range(n):
+        if format_regexes[m].search(line) is not None:
+            return statement_formats[m]
+    return statement_formats[n]
+
+
+# statement header row, the column names are tab separated with a trailing
+# space on posix
+def header_text(columns: list) -> str:
+    separator = ' \t' if os.name == 'posix' else '\t'
+    return separator.join(columns)
+
+
+def header_regex(columns: list) -> re.Pattern:
+    return re.compile(re.escape(header_text(columns)))
+
+
 class ParseState(Enum):
-    PRE_PARSE = 0
     PARSING = 1
     POST_PARSE = 2
 
 
-def parse_santander_current_account_statement(lines: []) -> bool:
+def read_santander_current_account_statement(lines, parsed) -> list:
     Logger.log_info('parsing santander current account statement')
-    Database.clear_parsed_text()
-    state = ParseState.PRE_PARSE
-    count = 0
-    new_count = 0
+    state = ParseState.PARSING
+    entries = []
 
     for line in lines:
 
-        if state == ParseState.PRE_PARSE:
-            Database.add_parsed_line(False, line)
-
-            # 'Date	Description	Money in	Money out	Balance'
-            if os.name == 'nt' and line == 'Date\tDescription\tMoney in\tMoney out\tBalance':
-                state = ParseState.PARSING
-                continue
-            if os.name == 'posix' and line == 'Date \tDescription \tMoney in \tMoney out \tBalance':
-                state = ParseState.PARSING
-                continue
-
         if state == ParseState.PARSING:
             try:
 
@@ -75,66 +221,41 @@ def parse_santander_current_account_statement(lines: []) -> bool:
                     date = datetime.date(int(ds[2]), int(ds[1]), int(ds[0]))
                     entry = StatementData.StatementEntry()
                     entry.type = StatementData.StatementEntryType.SANTANDER_CURRENT_ACCOUNT
-                    entry.balance = locale.atof(ts[4].replace('£', '').replace(',', ''))
+                    entry.balance = StatementData.parse_pence(ts[4])
                     entry.date = date
                     entry.week_no = calculate_week_no(date)
                     entry.description = ts[1]
 
                     if len(ts[2]) == 0:
-                        entry.amount = -locale.atof(ts[3].replace('£', '').replace(',', ''))
+                        entry.amount = -StatementData.parse_pence(ts[3])
                     else:
-                        entry.amount = locale.atof(ts[2].replace('£', '').replace(',', ''))
-
-                    entry.included_weekly = is_weekly_included(entry)
-                    entry.included_monthly = is_monthly_included(entry)
+                        entry.amount = StatementData.parse_pence(ts[2])
 
-                    count += 1
-                    entry.seq_no = Database.next_seq_no()
+                    entry.included_weekly = Rules.is_weekly_included(entry)
+                    entry.included_monthly = Rules.is_monthly_included(entry)
 
-                    n = Database.add_statement_entry(Database.statement_entries, entry)
-                    if n != -1:
-                        # new entry
-                        new_count += 1
-                        entry.is_new = True
-                        entry.lookup = n
-                    else:
-                        entry.is_new = False
-                        entry.lookup = -1
+                    entries.append(entry)
 
-                    Database.add_parsed_line(True, line)
+                    parsed.append((True, line))
 
             except ValueError as ex:
                 Logger.log_error(f'error parsing line \'{line}\': {repr(ex)}')
-                Database.add_parsed_line(False, '**** Error ***')
+                parsed.append((False, '**** Error ***'))
                 state = ParseState.POST_PARSE
 
         if state == ParseState.POST_PARSE:
-            Database.add_parsed_line(False, line)
+            parsed.append((False, line))
 
-    Logger.log_info(f'Parsed Santander current account, {new_count} of {count} entries are new')
-    return new_count > 0
+    return entries
 
 
-def parse_santander_credit_card_statement(lines: []) -> bool:
+def read_santander_credit_card_statement(lines, parsed) -> list:
     Logger.log_info('parsing santander credit card statement')
-    Database.clear_parsed_text()
-    state = ParseState.PRE_PARSE
-    count = 0
-    new_count = 0
+    state = ParseState.PARSING
+    entries = []
 
     for line in lines:
 
-        if state == ParseState.PRE_PARSE:
-            Database.add_parsed_line(False, line)
-
-            if os.name == 'nt' and line == 'Date\tCard no.\tDescription\tMoney in\tMoney out':
-                state = ParseState.PARSING
-                continue
-            if os.name == 'posix' and line == 'Date \tCard no. \tDescription \tMoney in \tMoney out':
-                state = ParseState.PARSING
-                continue
-
-
         if state == ParseState.PARSING:
             try:
                 # 24/02/2022	**3878	GOOGLE PAY CHIPPENHAM CAFFE NERO CHIPPENHAM		£4.35
@@ -158,57 +279,38 @@ def parse_santander_credit_card_statement(lines: []) -> bool:
                         entry.description = ts[2]
 
                         if len(ts[3]) == 0:
-                            entry.amount = -locale.atof(ts[4].replace('£', '').replace(',', ''))
+                            entry.amount = -StatementData.parse_pence(ts[4])
                         else:
-                            entry.amount = locale.atof(ts[3].replace('£', '').replace(',', ''))
-
-                        entry.included_weekly = is_weekly_included(entry)
-                        entry.included_monthly = is_monthly_included(entry)
+                            entry.amount = StatementData.parse_pence(ts[3])
 
-                        count += 1
-                        entry.seq_no = Database.next_seq_no()
+                        entry.included_weekly = Rules.is_weekly_included(entry)
+                        entry.included_monthly = Rules.is_monthly_included(entry)
 
-                        n = Database.add_statement_entry(Database.statement_entries, entry)
-                        if n != -1:
-                            # new entry
-                            new_count += 1
-                            entry.is_new = True
-                            entry.lookup = n
-                        else:
-                            entry.is_new = False
-                            entry.lookup = -1
+                        entries.append(entry)
 
-                        Database.add_parsed_line(True, line)
+                        parsed.append((True, line))
 
             except ValueError as ex:
                 Logger.log_error(f'error parsing line \'{line}\': {repr(ex)}')
-                Database.add_parsed_line(False, '**** Error ***')
+                parsed.append((False, '**** Error ***'))
                 state = ParseState.POST_PARSE
 
         if state == ParseState.POST_PARSE:
-            Database.add_parsed_line(False, line)
+            parsed.append((False, line))
 
-    Logger.log_info(f'Parsed Santander credit card statement, {new_count} of {count} entries are new')
-    return new_count > 0
+    return entries
 
 
-def parse_cash_plus_statement(lines: []) -> bool:
+def read_cash_plus_statement(lines, parsed) -> list:
     Logger.log_info('parsing cashplus statement')
-    Database.clear_parsed_text()
-    state = ParseState.PRE_PARSE
-    count = 0
-    new_count = 0
-    ln = 0
-
-    while ln < len(lines):
+    state = ParseState.PARSING
+    entries = []
 
-        if state == ParseState.PRE_PARSE:
-            Database.add_parsed_line(False, lines[ln])
+    # the description and amount lines of an entry are read from lines as
+    # they are needed, after its date line
+    lines = iter(lines)
 
-            if lines[ln] == 'Balance':
-                state = ParseState.PARSING
-                ln += 1
-                continue
+    for line in lines:
 
         if state == ParseState.PARSING:
             try:
@@ -218,11 +320,11 @@ def parse_cash_plus_statement(lines: []) -> bool:
                 # £1.10
 
                 # end of data
-                if len(lines[ln]) < 10:
+                if len(line) < 10:
                     state = ParseState.POST_PARSE
                 else:
                     # parse date
-                    ts = lines[ln].split('\t')
+                    ts = line.split('\t')
                     ds = ts[0].strip().split('/')
 
                     if len(ds) < 3:
@@ -234,91 +336,77 @@ def parse_cash_plus_statement(lines: []) -> bool:
                         entry.type = StatementData.StatementEntryType.CASH_PLUS
                         entry.date = date
                         entry.week_no = calculate_week_no(date)
-                        entry.description = lines[ln + 1]
+                        date_line = line
+                        entry.description = next(lines, '')
 
                         # amount
-                        ln += 2
-                        ts = lines[ln].split('\t')
+                        line = next(lines, '')
+                        ts = line.split('\t')
 
                         if os.name == 'posix':
                             if len(ts[1]) == 0:
                                 # debit
-                                entry.amount = -locale.atof(ts[2].replace('£', '').replace(',', ''))
+                                entry.amount = -StatementData.parse_pence(ts[2])
                                 # first entry does not include the balance
                                 if len(ts[3]) > 0:
-                                    entry.balance = locale.atof(ts[3].replace('£', '').replace(',', ''))
+                                    entry.balance = StatementData.parse_pence(ts[3])
                             else:
                                 # credit
-                                entry.amount = locale.atof(ts[1].replace('£', '').replace(',', ''))
+                                entry.amount = StatementData.parse_pence(ts[1])
                                 if len(ts[3]) > 0:
-                                    entry.balance = locale.atof(ts[3].replace('£', '').replace(',', ''))
+                                    entry.balance = StatementData.parse_pence(ts[3])
                         elif os.name == 'nt':
                             if len(ts) == 2:
                                 # debit
-                                entry.amount = -locale.atof(ts[0].replace('£', '').replace(',', ''))
+                                entry.amount = -StatementData.parse_pence(ts[0])
                                 # first entry does not include the balance
                                 if len(ts[1]) > 0:
-                                    entry.balance = locale.atof(ts[1].replace('£', '').replace(',', ''))
+                                    entry.balance = StatementData.parse_pence(ts[1])
                             else:
                                 # credit
-                                entry.amount = locale.atof(ts[0].replace('£', '').replace(',', ''))
+                                entry.amount = StatementData.parse_pence(ts[0])
                                 if len(ts[2]) > 0:
-                                    entry.balance = locale.atof(ts[2].replace('£', '').replace(',', ''))
-
-                        entry.included_weekly = is_weekly_included(entry)
-                        entry.included_monthly = is_monthly_included(entry)
+                                    entry.balance = StatementData.parse_pence(ts[2])
 
-                        count += 1
-                        entry.seq_no = Database.next_seq_no()
-
-                        n = Database.add_statement_entry(Database.statement_entries, entry)
-                        if n != -1:
-                            # new entry
-                            new_count += 1
-                            entry.is_new = True
-                            entry.lookup = n
-                        else:
-                            entry.is_new = False
-                            entry.lookup = -1
+                        entry.included_weekly = Rules.is_weekly_included(entry)
+                        entry.included_monthly = Rules.is_monthly_included(entry)
 
+                        entries.append(entry)
 
-                        Database.add_parsed_line(True, lines[ln - 2])
-                        Database.add_parsed_line(True, lines[ln - 1])
-                        Database.add_parsed_line(True, lines[ln])
+                        parsed.append((True, date_line))
+                        parsed.append((True, entry.description))
+                        parsed.append((True, line))
 
             except ValueError as ex:
-                Logger.log_error(f'error parsing line \'{lines[ln]}\': {repr(ex)}')
-                Database.add_parsed_line(False, '**** Error ***')
+                Logger.log_error(f'error parsing line \'{line}\': {repr(ex)}')
+                parsed.append((False, '**** Error ***'))
                 state = ParseState.POST_PARSE
 
         if state == ParseState.POST_PARSE:
-            Database.add_parsed_line(False, lines[ln])
-
-        ln += 1
+            parsed.append((False, line))
 
-    Logger.log_info(f'Parsed Cashplus card statement, {new_count} of {count} entries are new')
-    return new_count > 0
+    return entries
 
 
-def calculate_week_no(date: datetime.date) -> int:
-    # mon 5th Jan 2015 is week 0
-    return int((date.toordinal() - datetime.date(2015, 1, 5).toordinal()) / 7)
+# 'Date	Description	Money in	Money out	Balance'
+# if line.__contains__('09-01-28 43377166 - 123 CURRENT ACCOUNT'):
+register_statement_format(StatementFormat(
+    'Santander current account', ['1|2|3 Current Account earnings'],
+    header_regex(['Date', 'Description', 'Money in', 'Money out', 'Balance']),
+    read_santander_current_account_statement))
 
+# if line.__contains__('xxxx xxxx xxxx 3878 - SANTANDER 1 2 3 CASHBACK CARD'):
+register_statement_format(StatementFormat(
+    'Santander credit card statement', ['1|2|3 Credit Card earnings'],
+    header_regex(['Date', 'Card no.', 'Description', 'Money in', 'Money out']),
+    read_santander_credit_card_statement))
 
-def is_weekly_included(entry: StatementData.StatementEntry) -> bool:
-    return not entry.description.upper().__contains__("LEEDS BUILDING SOC") and \
-           not entry.description.upper().__contains__("CASHPLUS") and \
-           not entry.description.upper().__contains__("EDF ENERGY") and \
-           not entry.description.upper().__contains__("WILTSHIRE COUNCIL") and \
-           not entry.description.upper().__contains__("BT GROUP PLC") and \
-           not entry.description.upper().__contains__("CAMELOT LOTTERY") and \
-           not entry.description.upper().__contains__("BRISTOLWESSEXWATER") and \
-           not entry.description.upper().__contains__("SANTANDERCARDS") and \
-           not entry.description.upper().__contains__("WINDOW PAYNE") and \
-           not entry.description.upper().__contains__("INITIAL BALANCE") and \
-           entry.amount < 0 and \
-           entry.amount > -1000
+register_statement_format(StatementFormat(
+    'Cashplus card statement', ['CashPlus Online Banking'],
+    re.compile('Balance'),
+    read_cash_plus_statement))
 
 
-def is_monthly_included(entry: StatementData.StatementEntry) -> bool:
-    return entry.amount < 0 and entry.amount > -1000 and entry.type == StatementData.StatementEntryType.SANTANDER_CURRENT_ACCOUNT
+def calculate_week_no(date: datetime.date) -> int:
+    # mon 5th Jan 2015 is week 0
+    return int((date.toordinal() - datetime.date(2015, 1, 5).toordinal()) / 7)
@@ -0,0 +1,163 @@
+import StatementData as StatementData
+import Logger as Logger
+import configparser as configparser
+import re as re
+from pathlib import Path
+
+# -----------------------------------------------------------------------
+# rules for which statement entries are included in the weekly and monthly
+# summaries, loaded from a config file
+#
+#   [weekly]
+#   excluded payees =
+#       LEEDS BUILDING SOC
+#       CASHPLUS
+#
+#   [limits]
+#   largest spend = 1000.00
+#
+# an entry is included if it is a spend of less than the largest spend, for
+# weekly summaries its description must not contain an excluded payee and for
+# monthly summaries it must be from the current account. payees are matched
+# ignoring case
+
+# rules file loaded when the module is imported, if it exists
+RULES_FILE = str(Path(__file__).parent / 'rules.ini')
+
+DEFAULT_EXCLUDED_PAYEES = ['LEEDS BUILDING SOC', 'CASHPLUS', 'EDF ENERGY', 'WILTSHIRE COUNCIL', 'BT GROUP PLC',
+                           'CAMELOT LOTTERY', 'BRISTOLWESSEXWATER', 'SANTANDERCARDS', 'WINDOW PAYNE',
+                           'INITIAL BALANCE']
+
+DEFAULT_LARGEST_SPEND = 100000
+
+# current rules, set by set_rules, payees are upper case and spend is in pence
+excluded_payees: list = []
+largest_spend: int = 0
+
+# regex matching any excluded payee in an upper case description
+excluded_regex: re.Pattern = None
+
+
+# -----------------------------------------------------------------------
+# set the rules and compile the payees into one regex
+def set_rules(payees: list, spend: int) -> None:
+    global excluded_payees
+    global largest_spend
+    global excluded_regex
+    excluded_payees = sorted({payee.strip().upper() for payee in payees if len(payee.strip()) > 0})
+    largest_spend = spend
+    excluded_regex = re.compile(trie_regex(excluded_payees))
+
+
+# -----------------------------------------------------------------------
+# load the rules from a config file, the default rules are used for anything
+# not in the file
+# returns False if the file could not be read
+def load_rules(file_name: str) -> bool:
+    config = configparser.ConfigParser()
+    try:
+        with open(file_name, mode='r', encoding='utf-8') as f:
+            config.read_file(f)
+        payees = config.get('weekly', 'excluded payees', fallback=None)
+        payees = DEFAULT_EXCLUDED_PAYEES if payees is None else payees.split('\n')
+        spend = config.get('limits', 'largest spend', fallback=None)
+        spend = DEFAULT_LARGEST_SPEND if spend is None else StatementData.parse_pence(spend)
+    except (OSError, configparser.Error, ValueError) as ex:
+        Logger.log_error(f'Could not read rules from \'{file_name}\': {repr(ex)}')
+        return False
+
+    set_rules(payees, spend)
+    return True
+
+
+# -----------------------------------------------------------------------
+# regex matching any of a list of strings, as a trie so a position in the
+# text is checked against the strings' common prefixes once rather than
+# against each string in turn
+def trie_regex(strings: list) -> str:
+    trie = {}
+    for s in strings:
+        node = trie
+        for c in s:
+            node = node.setdefault(c, {})
+        # end of a string
+        node[''] = {}
+
+    if len(trie) == 0:
+        # matches nothing
+        return '(?!)'
+    return trie_node_regex(trie)
+
+
+def trie_node_regex(node: dict) -> str:
+    ends = '' in node
+    branches = [re.escape(c) + trie_node_regex(child) for c, child in sorted(node.items()) if c != '']
+    if len(branches) == 0:
+        return ''
+
+    regex = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if ends:
+        # a string ends here, the rest is optional
+        regex = '(?:' + regex + ')?'
+    return regex
+
+
+# -----------------------------------------------------------------------
+# is an amount a spend within the largest spend
+def is_spend(amount: int) -> bool:
+    return 0 > amount > -largest_spend
+
+
+def is_weekly_included(entry: StatementData.StatementEntry) -> bool:
+    return is_spend(entry.amount) and excluded_regex.search(entry.description.upper()) is None
+
+
+def is_monthly_included(entry: StatementData.StatementEntry) -> bool:
+    return is_spend(entry.amount) and entry.type == StatementData.StatementEntryType.SANTANDER_CURRENT_ACCOUNT
+
+
+# -----------------------------------------------------------------------
+# apply the rules to many entries at once
+# returns tuple (list of weekly included, list of monthly included), in the order of entries
+def classify(entries) -> (list, list):
+    return classify_columns([entry.amount for entry in entries], [entry.type.value for entry in entries],
+                            [entry.description for entry in entries])
+
+
+# -----------------------------------------------------------------------
+# apply the rules to the values of one entry, its amount, StatementEntryType
+# value and description
+# returns tuple (weekly included, monthly included)
+def classify_values(amount: int, t: int, description: str) -> (bool, bool):
+    if not 0 > amount > -largest_spend:
+        return False, False
+    return excluded_regex.search(description.upper()) is None, \
+        t == StatementData.StatementEntryType.SANTANDER_CURRENT_ACCOUNT.value
+
+
+# -----------------------------------------------------------------------
+# apply the rules to entries given as columns of amounts, StatementEntryType
+# values and descriptions, so entries held in a file need not be created
+# returns tuple as classify
+def classify_columns(amounts: list, types: list, descriptions: list) -> (list, list):
+    spends = [0 > amount > -largest_spend for amount in amounts]
+
+    current_account = StatementData.StatementEntryType.SANTANDER_CURRENT_ACCOUNT.value
+    monthly = [spend and t == current_account for spend, t in zip(spends, types)]
+
+    # upper case all the descriptions in one go, one line each
+    search = excluded_regex.search
+    upper = '\n'.join(descriptions).upper().split('\n')
+    if len(upper) != len(descriptions):
+        # a description has a line end in it
+        upper = [description.upper() for description in descriptions]
+    excluded = [search(description) is not None for description in upper]
+
+    weekly = [spend and not exclude for spend, exclude in zip(spends, excluded)]
+    return weekly, monthly
+
+
+# -----------------------------------------------------------------------
+set_rules(DEFAULT_EXCLUDED_PAYEES, DEFAULT_LARGEST_SPEND)
+if Path(RULES_FILE).exists():
+    load_rules(RULES_FILE)
@@ -0,0 +1,173 @@
+import StatementData as StatementData
+import BinaryFile as BinaryFile
+import datetime as datetime
+import sqlite3 as sqlite3
+from pathlib import Path
+
+# -----------------------------------------------------------------------
+# SQLite database file, used for files named *.db or *.sqlite
+#
+# one table of entries, in no particular order, with an index giving the
+# entry order and a unique index on the dedup key so duplicates are dropped
+# by the database as they are inserted. dates are ordinals, types are
+# StatementEntryType values and flags are as in a binary file. month is
+# year * 12 + month - 1 so monthly summaries can be grouped on it.
+#
+# changes are saved in place, each save is one transaction
+
+FILE_SUFFIXES = ['.db', '.sqlite']
+
+# start of every SQLite file
+SQLITE_HEADER = b'SQLite format 3\0'
+
+SCHEMA_VERSION = 1
+
+SCHEMA = ['CREATE TABLE IF NOT EXISTS entries ('
+          'type INTEGER NOT NULL, date INTEGER NOT NULL, amount INTEGER NOT NULL, balance INTEGER NOT NULL, '
+          'week_no INTEGER NOT NULL, month INTEGER NOT NULL, seq_no INTEGER NOT NULL, flags INTEGER NOT NULL, '
+          'description TEXT NOT NULL)',
+          'CREATE INDEX IF NOT EXISTS entries_order ON entries (date, type, seq_no)',
+          'CREATE UNIQUE INDEX IF NOT EXISTS entries_dedup ON entries (type, date, amount, balance)',
+          f'PRAGMA user_version = {SCHEMA_VERSION}']
+
+COLUMNS = 'type, date, amount, balance, week_no, seq_no, flags, description'
+
+INSERT = 'INSERT OR IGNORE INTO entries (type, date, amount, balance, week_no, month, seq_no, flags, description) ' \
+         'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+
+UPDATE = 'UPDATE entries SET flags = ? WHERE type = ? AND date = ? AND amount = ? AND balance = ?'
+
+# flags of entries counted in the summaries
+WEEKLY_FLAGS = BinaryFile.FLAG_INCLUDED_WEEKLY | BinaryFile.FLAG_USER_EXCLUDED
+MONTHLY_FLAGS = BinaryFile.FLAG_INCLUDED_MONTHLY | BinaryFile.FLAG_USER_EXCLUDED
+
+# tuples (week no, first date, total, transactions, entry count), in date order
+WEEKLY_SUMMARIES = 'SELECT week_no, MIN(date), ' \
+                   f'-SUM(CASE WHEN flags & {WEEKLY_FLAGS} = {BinaryFile.FLAG_INCLUDED_WEEKLY} ' \
+                   'THEN amount ELSE 0 END), ' \
+                   f'SUM(flags & {WEEKLY_FLAGS} = {BinaryFile.FLAG_INCLUDED_WEEKLY}), COUNT(*) ' \
+                   'FROM entries GROUP BY week_no ORDER BY MIN(date)'
+
+# tuples (month, total, transactions, entry count), in date order
+MONTHLY_SUMMARIES = 'SELECT month, ' \
+                    f'-SUM(CASE WHEN flags & {MONTHLY_FLAGS} = {BinaryFile.FLAG_INCLUDED_MONTHLY} ' \
+                    'THEN amount ELSE 0 END), ' \
+                    f'SUM(flags & {MONTHLY_FLAGS} = {BinaryFile.FLAG_INCLUDED_MONTHLY}), COUNT(*) ' \
+                    'FROM entries GROUP BY month ORDER BY month'
+
+_TYPES = {t.value: t for t in StatementData.StatementEntryType}
+
+
+# -----------------------------------------------------------------------
+# is a file name one of an SQLite file
+def is_sqlite_name(file_name: str) -> bool:
+    return Path(file_name).suffix.lower() in FILE_SUFFIXES
+
+
+# -----------------------------------------------------------------------
+# does a file start with the SQLite header
+def is_sqlite_file(file_name: str) -> bool:
+    with open(file_name, mode='rb') as f:
+        return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+
+# -----------------------------------------------------------------------
+# connect to a file, creating the schema if it is not there
+def connect(file_name: str, read_only: bool = False) -> sqlite3.Connection:
+    if read_only:
+        connection = sqlite3.connect(Path(file_name).absolute().as_uri() + '?mode=ro', uri=True,
+                                     check_same_thread=False)
+    else:
+        connection = sqlite3.connect(file_name, check_same_thread=False)
+        with connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+    return connection
+
+
+# -----------------------------------------------------------------------
+def entry_flags(entry: StatementData.StatementEntry) -> int:
+    return (BinaryFile.FLAG_INCLUDED_WEEKLY if entry.included_weekly else 0) | \
+           (BinaryFile.FLAG_INCLUDED_MONTHLY if entry.included_monthly else 0) | \
+           (BinaryFile.FLAG_USER_EXCLUDED if entry.user_excluded else 0)
+
+
+# -----------------------------------------------------------------------
+# row values of an entry for INSERT
+def entry_row(entry: StatementData.StatementEntry) -> tuple:
+    date = entry.date
+    return (entry.type.value, date.toordinal(), entry.amount, entry.balance, entry.week_no,
+            date.year * 12 + date.month - 1, entry.seq_no, entry_flags(entry), entry.description)
+
+
+# -----------------------------------------------------------------------
+# create the statement entry from a row of COLUMNS
+def entry_from_row(row: tuple) -> StatementData.StatementEntry:
+    t, date, amount, balance, week_no, seq_no, flags, description = row
+    entry = StatementData.StatementEntry(
+        type=_TYPES.get(t, StatementData.StatementEntryType.NONE),
+        amount=amount,
+        balance=balance,
+        date=datetime.date.fromordinal(date),
+        week_no=week_no,
+        seq_no=seq_no,
+        included_weekly=bool(flags & BinaryFile.FLAG_INCLUDED_WEEKLY),
+        included_monthly=bool(flags & BinaryFile.FLAG_INCLUDED_MONTHLY),
+        description=description)
+    entry.user_excluded = bool(flags & BinaryFile.FLAG_USER_EXCLUDED)
+    return entry
+
+
+# -----------------------------------------------------------------------
+# write entries to a new file in one transaction
+def write(file_name: str, entries) -> None:
+    connection = connect(file_name)
+    try:
+        with connection:
+            connection.execute('DELETE FROM entries')
+            connection.executemany(INSERT, map(entry_row, entries))
+    finally:
+        connection.close()
+
+
+# -----------------------------------------------------------------------
+# save changes to a file in one transaction, entries already in the file are
+# ignored and updated entries are found by their dedup key
+# returns the number of entries inserted
+def save(file_name: str, added: list, updated: list) -> int:
+    connection = connect(file_name)
+    try:
+        with connection:
+            before = connection.total_changes
+            connection.executemany(INSERT, map(entry_row, added))
+            inserted = connection.total_changes - before
+            connection.executemany(UPDATE, [(entry_flags(entry),) + StatementData.dedup_key(entry)
+                                            for entry in updated])
+        return inserted
+    finally:
+        connection.close()
+
+
+# -----------------------------------------------------------------------
+# read all the entries from a file, in order
+def read(file_name: str) -> []:
+    connection = connect(file_name, read_only=True)
+    try:
+        return [entry_from_row(row) for row in
+                connection.execute(f'SELECT {COLUMNS} FROM entries ORDER BY date, type, seq_no')]
+    finally:
+        connection.close()
+
+
+# -----------------------------------------------------------------------
+# weekly and monthly summaries from the entries in a file
+# returns tuple (list of weekly tuples, list of monthly tuples) as WEEKLY_SUMMARIES and MONTHLY_SUMMARIES
+def read_summaries(connection: sqlite3.Connection) -> (list, list):
+    return connection.execute(WEEKLY_SUMMARIES).fetchall(), connection.execute(MONTHLY_SUMMARIES).fetchall()
+
+
+# -----------------------------------------------------------------------
+# largest sequence number in a file, -1 if it has no entries
+def max_seq_no(connection: sqlite3.Connection) -> int:
+    n = connection.execute('SELECT MAX(seq_no) FROM entries').fetchone()[0]
+    return -1 if n is None else n
@@ -43,14 +43,50 @@ class StatementEntryType(Enum):
             return StatementEntryType.NONE
 
 
+# StatementEntryType by value, the values run from 0
+_TYPES = tuple(StatementEntryType)
+_TYPE_STRS = tuple(str(t) for t in _TYPES)
+
+# positions in the StatementEntry display string cache
+_AMOUNT_STR = 0
+_BALANCE_STR = 1
+_DATE_STR = 2
+_WEEK_NO_STR = 3
+_INCLUDED_SUMMARY = 4
+_STR_COUNT = 5
+
+# month strings by year * 12 + month - 1, shared by all the entries of a month
+# rather than cached by each entry as every entry's month is used for the summaries
+_month_strs: dict = {}
+
+
+# -----------------------------------------------------------------------
+# money is held as a whole number of pence and only formatted for display
+
+# parse an amount of money such as '-£1,234.56' to pence
+def parse_pence(text: str) -> int:
+    return round(locale.atof(text.replace('£', '').replace(',', '').strip()) * 100)
+
+
+# format pence as pounds, e.g. -123456 as '-£1,234.56'
+def money_str(pence: int) -> str:
+    pounds, remainder = divmod(abs(pence), 100)
+    if pence < 0:
+        return '-£{:,}.{:02d}'.format(pounds, remainder)
+    else:
+        return '£{:,}.{:02d}'.format(pounds, remainder)
+
+
 # -----------------------------------------------------------------------
 # Weekly/Monthly Summary
 class StatementSummary:
 
+    __slots__ = ('_summary_id', '_summary_date', '_total', '_transactions', '_entries')
+
     def __init__(self,
                  summary_id: str = "",
                  summary_date: datetime.date = datetime.date(2000, 1, 1),
-                 total: float = 0.0,
+                 total: int = 0,
                  transactions: int = 0) -> None:
         self._summary_id = summary_id
         self._summary_date = summary_date
@@ -92,10 +128,7 @@ class StatementSummary:
 
     @property
     def total_str(self) -> str:
-        if self._total < 0:
-            return '-£{:,.2f}'.format(-self._total)
-        else:
-            return '£{:,.2f}'.format(self._total)
+        return money_str(self._total)
 
     @total.setter
     def total(self, value) -> None:
@@ -132,22 +165,27 @@ class StatementSummary:
 # -----------------------------------------------------------------------
 # Statement entry taken from a line in a bank statement,
 # includes an amount the current account balance, type of account etc.
+# the type is held as its value and the date as its ordinal to keep entries small.
+# display strings are formatted when first used and kept until the field changes
 class StatementEntry:
 
+    __slots__ = ('_type', '_amount', '_balance', '_date', '_week_no', '_seq_no', '_included_weekly',
+                 '_included_monthly', '_description', '_is_new', '_user_excluded', '_strs')
+
     def __init__(self,
                  type: StatementEntryType = StatementEntryType.NONE,
-                 amount: float = 0.0,
-                 balance: float = 0.0,
+                 amount: int = 0,
+                 balance: int = 0,
                  date: datetime.date = datetime.date(2000, 1, 1),
                  week_no: int = 0,
                  seq_no: int = 0,
                  included_weekly: bool = False,
                  included_monthly: bool = False,
                  description: str = "") -> None:
-        self._type = type
+        self._type = type.value
         self._amount = amount
         self._balance = balance
-        self._date = date
+        self._date = date.toordinal()
         self._week_no = week_no
         # the order it appears in the original bank statement
         self._seq_no = seq_no
@@ -156,13 +194,29 @@ class StatementEntry:
         self._description = description
         self._is_new = False
         self._user_excluded = False
-        # position in Database.statement_entries
-        self._lookup = -1
+        # display string cache, list of _STR_COUNT strings or None for those not formatted yet
+        self._strs = None
+
+    # -----------------------------------------------------------------------
+    # display string cache
+    def _cached_str(self, n: int):
+        return None if self._strs is None else self._strs[n]
+
+    def _cache_str(self, n: int, s: str) -> str:
+        if self._strs is None:
+            self._strs = [None] * _STR_COUNT
+        self._strs[n] = s
+        return s
+
+    def _uncache_str(self, *ns) -> None:
+        if self._strs is not None:
+            for n in ns:
+                self._strs[n] = None
 
     # -----------------------------------------------------------------------
     def __str__(self) -> str:
         return '{}, {}, {}, {}, {}, {}, {}'.format(
-            str(self._type) ,
+            self.type_str,
             self.amount_str,
             self.balance_str,
             self.date_str,
@@ -181,15 +235,15 @@ class StatementEntry:
     # entry type accessors
     @property
     def type(self):
-        return self._type
+        return _TYPES[self._type]
 
     @property
     def type_str(self) -> str:
-        return str(self._type)
+        return _TYPE_STRS[self._type]
 
     @type.setter
     def type(self, value) -> None:
-        self._type = value
+        self._type = value.value
 
     # -----------------------------------------------------------------------
     # amount accessors
@@ -199,14 +253,13 @@ class StatementEntry:
 
     @property
     def amount_str(self) -> str:
-        if self._amount < 0:
-            return '-£{:,.2f}'.format(-self._amount)
-        else:
-            return '£{:,.2f}'.format(self._amount)
+        s = self._cached_str(_AMOUNT_STR)
+        return s if s is not None else self._cache_str(_AMOUNT_STR, money_str(self._amount))
 
     @amount.setter
     def amount(self, value) -> None:
         self._amount = value
+        self._uncache_str(_AMOUNT_STR)
 
     # -----------------------------------------------------------------------
     # balance accessors
@@ -216,30 +269,34 @@ class StatementEntry:
 
     @property
     def balance_str(self) -> str:
-        if self._balance < 0:
-            return '-£{:,.2f}'.format(-self._balance)
-        else:
-            return '£{:,.2f}'.format(self._balance)
+        s = self._cached_str(_BALANCE_STR)
+        return s if s is not None else self._cache_str(_BALANCE_STR, money_str(self._balance))
 
     @balance.setter
     def balance(self, value) -> None:
         self._balance = value
+        self._uncache_str(_BALANCE_STR)
 
     # -----------------------------------------------------------------------
     # date accessors
     @property
     def date(self):
-        return self._date
+        return datetime.date.fromordinal(self._date)
 
     @property
     def date_str(self) -> str:
-        dow = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-        return '{:02d}/{:02d}/{:02d} {}'.format(self._date.day,  self._date.month, self._date.year,
-                                                dow[self._date.weekday()])
+        s = self._cached_str(_DATE_STR)
+        if s is None:
+            dow = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+            date = self.date
+            s = self._cache_str(_DATE_STR, '{:02d}/{:02d}/{:02d} {}'.format(date.day,  date.month, date.year,
+                                                                            dow[date.weekday()]))
+        return s
 
     @date.setter
     def date(self, value) -> None:
-        self._date = value
+        self._date = value.toordinal()
+        self._uncache_str(_DATE_STR)
 
     # -----------------------------------------------------------------------
     # week no accessors
@@ -249,11 +306,13 @@ class StatementEntry:
 
     @property
     def week_no_str(self) -> str:
-        return '{}'.format(self._week_no)
+        s = self._cached_str(_WEEK_NO_STR)
+        return s if s is not None else self._cache_str(_WEEK_NO_STR, '{}'.format(self._week_no))
 
     @week_no.setter
     def week_no(self, value) -> None:
         self._week_no = value
+        self._uncache_str(_WEEK_NO_STR)
 
     # -----------------------------------------------------------------------
     # seq no accessors
@@ -285,6 +344,7 @@ class StatementEntry:
     @included_weekly.setter
     def included_weekly(self, value) -> None:
         self._included_weekly = value
+        self._uncache_str(_INCLUDED_SUMMARY)
 
     # -----------------------------------------------------------------------
     # included monthly accessors
@@ -302,6 +362,7 @@ class StatementEntry:
     @included_monthly.setter
     def included_monthly(self, value) -> None:
         self._included_monthly = value
+        self._uncache_str(_INCLUDED_SUMMARY)
 
     # -----------------------------------------------------------------------
     # user excluded accessors
@@ -319,18 +380,22 @@ class StatementEntry:
     @user_excluded.setter
     def user_excluded(self, value) -> None:
         self._user_excluded = value
+        self._uncache_str(_INCLUDED_SUMMARY)
 
     # -----------------------------------------------------------------------
     # inclusion flags summary
     @property
     def included_summary(self):
-        s = ""
-        if self._included_weekly:
-            s += 'W'
-        if self._included_monthly:
-            s += 'M'
-        if self._user_excluded:
-            s += 'X'
+        s = self._cached_str(_INCLUDED_SUMMARY)
+        if s is None:
+            s = ""
+            if self._included_weekly:
+                s += 'W'
+            if self._included_monthly:
+                s += 'M'
+            if self._user_excluded:
+                s += 'X'
+            self._cache_str(_INCLUDED_SUMMARY, s)
         return s
 
     # -----------------------------------------------------------------------
@@ -353,28 +418,23 @@ class StatementEntry:
     def is_new(self, value) -> None:
         self._is_new = value
 
-    # -----------------------------------------------------------------------
-    # index accessors
-    @property
-    def lookup(self):
-        return self._lookup
-
-    @lookup.setter
-    def lookup(self, value) -> None:
-        self._lookup = value
-
     # -----------------------------------------------------------------------
     # month str accessors
     @property
     def month_str(self):
-        return '{:02d}/{:04d}'.format(self._date.month, self._date.year)
+        date = self.date
+        month = date.year * 12 + date.month - 1
+        s = _month_strs.get(month)
+        if s is None:
+            s = _month_strs.setdefault(month, '{:02d}/{:04d}'.format(date.month, date.year))
+        return s
 
     # -----------------------------------------------------------------------
     # create a line of csv, comma separated with double quotes around each field
-    # as the current fields have comma delimiters
+    # as the current fields have comma delimiters, quotes in the description are doubled
     def to_csv(self) -> str:
         return '\"{}\",\"{}\",\"{}\",\"{}\",\"{}\",\"{}\",\"{}\",\"{}\",\"{}\",\"{}\"'.format(
-            str(self._type),
+            self.type_str,
             self.amount_str,
             self.balance_str,
             self.date_str,
@@ -382,7 +442,7 @@ class StatementEntry:
             self.seq_no_str,
             self.included_weekly_str,
             self.included_monthly_str,
-            self._description,
+            self._description.replace('\"', '\"\"'),
             self._user_excluded)
 
     # -----------------------------------------------------------------------
@@ -395,6 +455,8 @@ class StatementEntry:
     #           currency has currency symbol and thousand delimiters
     #
     def from_csv(self, csvstr: str, ver: float) -> bool:
+        # the fields are set directly, so drop any display strings
+        self._strs = None
         if ver == 1.1:
             return self.from_csv_v1_10(csvstr)
         elif ver == 1.2 or ver == 1.3 or ver == 1.4:
@@ -410,16 +472,16 @@ class StatementEntry:
             ts = csv_str.split(',', 6)
 
             # type
-            self._type = StatementEntryType.NONE.from_str(ts[0].strip())
+            self.type = StatementEntryType.NONE.from_str(ts[0].strip())
             # amount
-            self._amount = locale.atof(ts[1].replace('£', '').replace(',', ''))
+            self._amount = parse_pence(ts[1])
 
             # balance
-            self._balance = locale.atof(ts[2].replace('£', '').replace(',', ''))
+            self._balance = parse_pence(ts[2])
 
             # date
             ds = ts[3].strip().split(' ')[1].split('/')
-            self._date = datetime.date(int(ds[2]), int(ds[1]), int(ds[0]))
+            self.date = datetime.date(int(ds[2]), int(ds[1]), int(ds[0]))
 
             # week no
             self._week_no = int(ts[4])
@@ -447,21 +509,20 @@ class StatementEntry:
             ts = next(reader)
 
             # type
-            self._type = StatementEntryType.NONE.from_str(ts[0].strip())
+            self.type = StatementEntryType.NONE.from_str(ts[0].strip())
 
             # amount
-            self._amount = locale.atof(ts[1].replace('£', '').replace(',', '').strip())
+            self._amount = parse_pence(ts[1])
 
             # balance
-            s = ts[2].replace('£', '').replace(',', '').strip()
-            if len(s) > 0:
-                self._balance = locale.atof(s)
+            if len(ts[2].strip()) > 0:
+                self._balance = parse_pence(ts[2])
             else:
                 self._balance = 0
 
             # date
             ds = ts[3].strip().split(' ')[0].split('/')
-            self._date = datetime.date(int(ds[2]), int(ds[1]), int(ds[0]))
+            self.date = datetime.date(int(ds[2]), int(ds[1]), int(ds[0]))
 
             # week no
             self._week_no = int(ts[4])
@@ -499,6 +560,18 @@ def is_equal_statement_entries(se1: StatementEntry, se2: StatementEntry) -> bool
            se1.balance == se2.balance
 
 
+# key identifying duplicate entries, two entries with equal keys are equal
+# according to is_equal_statement_entries.
+# keys use the stored type value and date ordinal, so no objects are created for them
+def dedup_key(se: StatementEntry) -> tuple:
+    return se._type, se._date, se._amount, se._balance
+
+
+# key giving the same ordering as compare_statement_entries
+def sort_key(se: StatementEntry) -> tuple:
+    return se._date, se._type, se._seq_no
+
+
 def compare_statement_entries(se1: StatementEntry, se2: StatementEntry) -> int:
     # returns -1, 0, 1
 
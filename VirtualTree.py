@@ -0,0 +1,177 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+# -----------------------------------------------------------------------
+# a tree view showing a window onto a long list of rows, only the rows in
+# view plus a buffer either side are inserted into the tree. the vertical
+# scroll bar covers the whole list and the window moves as the tree scrolls.
+#
+# count() returns the number of rows, row(n) returns the insert options for
+# row n as a dictionary of text, values and tags and iid(n) returns a tree
+# item id for row n that stays the same when rows are inserted before it
+class VirtualTree:
+
+    # rows inserted either side of the rows in view
+    BUFFER = 100
+
+    # rows inserted in the tree
+    WINDOW = 300
+
+    def __init__(self, tree: ttk.Treeview, scroll_v: tk.Scrollbar, count, row, iid) -> None:
+        self._tree = tree
+        self._scroll_v = scroll_v
+        self._count = count
+        self._row = row
+        self._iid = iid
+        # first row in the tree and number of rows in the tree
+        self._start = 0
+        self._rows = 0
+        # first row in view
+        self._top = 0
+        # set while the window is being filled
+        self._filling = False
+        # while frozen the list is not read, a fill is put off until thawed
+        self._frozen = False
+        self._fill_top = None
+
+        tree.configure(yscrollcommand=self.on_tree_scroll)
+        scroll_v.configure(command=self.on_scroll_bar)
+
+    # -----------------------------------------------------------------------
+    # tree accessors
+    @property
+    def tree(self) -> ttk.Treeview:
+        return self._tree
+
+    # -----------------------------------------------------------------------
+    # row n of the list for a tree item, -1 if it is not in the window
+    def row_of(self, iid: str) -> int:
+        if not self._tree.exists(iid):
+            return -1
+        return self._start + self._tree.index(iid)
+
+    # -----------------------------------------------------------------------
+    # tree item id for row n
+    def iid_of(self, n: int) -> str:
+        return self._iid(n)
+
+    # -----------------------------------------------------------------------
+    # rows in view, taken from the tree's view of the window
+    def _in_view(self) -> int:
+        first, last = self._tree.yview()
+        return max(1, round((last - first) * self._rows))
+
+    # -----------------------------------------------------------------------
+    # rebuild the window, keeping the same top row, after the list has changed
+    def refresh(self) -> None:
+        self.fill(self._top)
+
+    # -----------------------------------------------------------------------
+    # row n has been inserted into the list, only the tree item for row n is
+    # inserted, rows inserted together must be passed in ascending order
+    def insert_row(self, n: int) -> None:
+        if n < self._start:
+            # the window moves down the list with the rows in it
+            self._start += 1
+            self._top += 1
+        elif n <= self._start + self._rows:
+            self._filling = True
+            self._tree.insert('', n - self._start, iid=self.iid_of(n), open=False, **self._row(n))
+            self._rows += 1
+            if self._rows > self.WINDOW:
+                self._rows -= 1
+                self._tree.delete(self._tree.get_children()[-1])
+            self._filling = False
+        self._update_scroll_bar()
+
+    # -----------------------------------------------------------------------
+    # row n has changed, its tree item is updated if it is in the window
+    def update_row(self, n: int) -> None:
+        if self._start <= n < self._start + self._rows:
+            self._tree.item(self.iid_of(n), **self._row(n))
+
+    # -----------------------------------------------------------------------
+    # stop reading the list, e.g. while another thread is changing it
+    def freeze(self) -> None:
+        self._frozen = True
+
+    # -----------------------------------------------------------------------
+    # start reading the list again, doing any fill that was put off
+    def thaw(self) -> None:
+        self._frozen = False
+        if self._fill_top is not None:
+            self.fill(self._fill_top)
+
+    # -----------------------------------------------------------------------
+    # fill the window so that row top is at the top of the view
+    def fill(self, top: int) -> None:
+        if self._frozen:
+            self._fill_top = top
+            return
+        self._fill_top = None
+
+        n = self._count()
+        top = max(0, min(top, n - 1))
+
+        selection = self._tree.selection()
+        focus = self._tree.focus()
+
+        self._filling = True
+        self._tree.delete(*self._tree.get_children())
+        self._start = max(0, min(top - self.BUFFER, n - self.WINDOW))
+        self._rows = min(n, self._start + self.WINDOW) - self._start
+        for r in range(self._start, self._start + self._rows):
+            self._tree.insert('', tk.END, iid=self.iid_of(r), open=False, **self._row(r))
+
+        # keep the selection for rows still in the window
+        self._tree.selection_set([iid for iid in selection if self._tree.exists(iid)])
+        if len(focus) > 0 and self._tree.exists(focus):
+            self._tree.focus(focus)
+
+        self._top = top
+        if self._rows > 0:
+            self._tree.yview_moveto((top - self._start) / self._rows)
+        self._filling = False
+        self._update_scroll_bar()
+
+    # -----------------------------------------------------------------------
+    # show the scroll bar position in the whole list
+    def _update_scroll_bar(self) -> None:
+        if self._frozen:
+            return
+        n = self._count()
+        if n == 0:
+            self._scroll_v.set(0, 1)
+        else:
+            self._scroll_v.set(self._top / n, min(1.0, (self._top + self._in_view()) / n))
+
+    # -----------------------------------------------------------------------
+    # the tree has scrolled within the window, first and last are fractions of the window
+    def on_tree_scroll(self, first, last) -> None:
+        if self._filling or self._rows == 0:
+            return
+
+        self._top = self._start + round(float(first) * self._rows)
+        bottom = self._start + round(float(last) * self._rows)
+
+        # move the window when the view gets near its edges
+        if (self._top - self._start < self.BUFFER // 2 and self._start > 0) or \
+                (self._start + self._rows - bottom < self.BUFFER // 2 and self._start + self._rows < self._count()):
+            self.fill(self._top)
+        else:
+            self._update_scroll_bar()
+
+    # -----------------------------------------------------------------------
+    # scroll bar command, moveto fraction or scroll n units/pages
+    def on_scroll_bar(self, *args) -> None:
+        if args[0] == 'moveto':
+            if self._frozen:
+                return
+            top = int(float(args[1]) * self._count())
+            if self._start <= top and top + self._in_view() <= self._start + self._rows:
+                self._tree.yview_moveto((top - self._start) / self._rows)
+            else:
+                self.fill(top)
+        else:
+            self._tree.yview(*args)
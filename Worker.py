@@ -0,0 +1,85 @@
+import Database as Database
+import Instrument as Instrument
+import Logger as Logger
+import tkinter as tk
+import collections as collections
+import queue as queue
+import threading as threading
+
+
+# -----------------------------------------------------------------------
+# runs jobs that change the database on a worker thread so the GUI stays
+# responsive. a job runs with Database.lock held and its result is handed
+# back through a queue that the GUI polls with after, where done(result) is
+# called on the GUI thread.
+#
+# jobs run one at a time, the next is not started until the GUI has had the
+# result of the last, so the GUI must not read the database while busy
+class Worker:
+
+    # result poll interval, ms
+    POLL_INTERVAL = 50
+
+    def __init__(self, window: tk.Tk, on_start=None) -> None:
+        self._window = window
+        # called on the GUI thread before each job starts
+        self._on_start = on_start
+        # jobs waiting to start, tuples (job, done)
+        self._waiting = collections.deque()
+        self._done = None
+        self._jobs = queue.SimpleQueue()
+        self._results = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self.run, name='Worker', daemon=True)
+        self._thread.start()
+
+    # -----------------------------------------------------------------------
+    # is a job running, or finished with its result not yet handed back
+    @property
+    def busy(self) -> bool:
+        return self._done is not None
+
+    # -----------------------------------------------------------------------
+    # queue a job, job() is called on the worker thread and done(result) on the GUI thread
+    def submit(self, job, done) -> None:
+        self._waiting.append((job, done))
+        self._next()
+
+    # -----------------------------------------------------------------------
+    # start the next waiting job
+    def _next(self) -> None:
+        if self.busy or len(self._waiting) == 0:
+            return
+
+        job, self._done = self._waiting.popleft()
+        if self._on_start is not None:
+            self._on_start()
+        self._jobs.put(job)
+        self._window.after(self.POLL_INTERVAL, self.poll)
+
+    # -----------------------------------------------------------------------
+    # worker thread
+    def run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            try:
+                with Database.lock:
+                    result = Instrument.run_profiled(job)
+            except Exception as ex:
+                Logger.log_error(f'Job failed: {repr(ex)}')
+                result = None
+            self._results.put(result)
+
+    # -----------------------------------------------------------------------
+    # hand back the result of the running job when it is ready
+    def poll(self) -> None:
+        Logger.flush()
+        try:
+            result = self._results.get_nowait()
+        except queue.Empty:
+            self._window.after(self.POLL_INTERVAL, self.poll)
+            return
+
+        done = self._done
+        self._done = None
+        done(result)
+        self._next()
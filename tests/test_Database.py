@@ -0,0 +1,312 @@
+import datetime as datetime
+import os as os
+import random as random
+import sys
+import tempfile as tempfile
+import unittest as unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import StatementData as StatementData
+import Database as Database
+import Logger as Logger
+
+# -----------------------------------------------------------------------
+# read_file's bulk load must give the same entries as adding each line in
+# turn with add_statement_entry
+
+
+# -----------------------------------------------------------------------
+# lines of a "Money Reckoner 1.40" file of n entries in random order, with
+# duplicates of some entries that differ only in their description, so which
+# of the duplicates is kept can be seen
+def shuffled_file_lines(n: int, duplicates: int, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    types = [StatementData.StatementEntryType.SANTANDER_CURRENT_ACCOUNT,
+             StatementData.StatementEntryType.SANTANDER_CREDIT_CARD,
+             StatementData.StatementEntryType.CASH_PLUS]
+    start = datetime.date(2020, 1, 6).toordinal()
+    entries = []
+    for i in range(n):
+        # few dates so many entries share a date
+        date = datetime.date.fromordinal(start + rnd.randrange(n // 20 + 1))
+        entries.append(StatementData.StatementEntry(
+            type=rnd.choice(types),
+            amount=rnd.randint(-50000, 20000),
+            balance=rnd.randint(0, 1000000),
+            date=date,
+            week_no=(date.toordinal() - start) // 7,
+            seq_no=i,
+            included_weekly=rnd.random() < 0.5,
+            included_monthly=rnd.random() < 0.5,
+            description=f'PAYEE {i}'))
+
+    for i in rnd.sample(range(n), duplicates):
+        original = entries[i]
+        entries.append(StatementData.StatementEntry(
+            type=original.type, amount=original.amount, balance=original.balance, date=original.date,
+            week_no=original.week_no, seq_no=n + i, description=f'DUPLICATE {i}'))
+
+    rnd.shuffle(entries)
+    return ['Money Reckoner 1.40\n'] + [entry.to_csv() + '\n' for entry in entries]
+
+
+class TestReadFileBulk(unittest.TestCase):
+
+    def setUp(self) -> None:
+        Logger.set_level(Logger.ERROR)
+        self._directory = tempfile.TemporaryDirectory()
+        self._file_name = os.path.join(self._directory.name, 'statement.txt')
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+        Logger.set_level(Logger.INFO)
+
+    # entries as read, with their seq no
+    def read(self, bulk: bool) -> list:
+        self.assertTrue(Database.read_file(self._file_name, bulk=bulk))
+        return [(str(entry), entry.seq_no, entry.description) for entry in Database.statement_entries]
+
+    def test_bulk_matches_per_line(self) -> None:
+        lines = shuffled_file_lines(3000, 50)
+        with open(self._file_name, mode='w', encoding='utf-8') as f:
+            f.writelines(lines)
+
+        # the first of any duplicates in the file is kept
+        first = {}
+        for line in lines[1:]:
+            entry = StatementData.StatementEntry()
+            entry.from_csv(line, 1.4)
+            first.setdefault(StatementData.dedup_key(entry), entry.description)
+
+        bulk = self.read(True)
+        bulk_keys = set(Database.statement_keys)
+        per_line = self.read(False)
+
+        self.assertEqual(len(bulk), 3000)
+        self.assertEqual(bulk, per_line)
+        self.assertEqual(bulk_keys, Database.statement_keys)
+        self.assertEqual([seq_no for _, seq_no, _ in bulk], list(range(3000)))
+        self.assertEqual(sorted(description for _, _, description in bulk), sorted(first.values()))
+
+
+# -----------------------------------------------------------------------
+# entries and summaries of the database, to compare updates made to them
+# with summaries generated from scratch
+def database_state() -> tuple:
+    return ([(str(entry), entry.user_excluded) for entry in Database.statement_entries],
+            [(s.summary_id, s.summary_date, s.total, s.transactions, len(s.entries))
+             for s in Database.weekly_summaries],
+            [(s.summary_id, s.summary_date, s.total, s.transactions, len(s.entries))
+             for s in Database.monthly_summaries],
+            Database.yearly_spend)
+
+
+def generated_state() -> tuple:
+    Database.generate_weekly_summaries()
+    Database.generate_monthly_summaries()
+    return database_state()
+
+
+# -----------------------------------------------------------------------
+# toggling user exclusion adjusts the summaries and the yearly spend by the
+# entry's amount, they must agree with summaries generated from scratch
+class TestUserExcluded(unittest.TestCase):
+
+    def setUp(self) -> None:
+        Logger.set_level(Logger.ERROR)
+        self._directory = tempfile.TemporaryDirectory()
+        text_file = os.path.join(self._directory.name, 'statement.txt')
+        with open(text_file, mode='w', encoding='utf-8') as f:
+            f.writelines(shuffled_file_lines(2000, 0))
+
+        # a binary file with summaries is loaded lazily
+        binary_file = os.path.join(self._directory.name, 'statement.mrb')
+        Database.load_database(text_file)
+        self.assertTrue(Database.write_file(binary_file))
+        self._files = [(text_file, False), (binary_file, True)]
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+        Logger.set_level(Logger.INFO)
+
+    def test_toggles_match_generated(self) -> None:
+        for file_name, lazy in self._files:
+            with self.subTest(file_name=file_name):
+                self.assertTrue(Database.load_database(file_name, lazy=lazy))
+                # the entries cross april, so some are before the start of the yearly spend
+                self.assertIsNotNone(Database.yearly_spend_start)
+
+                rnd = random.Random(3)
+                for n in rnd.sample(range(len(Database.statement_entries)), 300):
+                    Database.update_user_excluded(Database.statement_entries[n])
+                self.assertEqual(len(Database.unsaved_updates), 300)
+                self.assertEqual(database_state(), generated_state())
+
+    def test_toggle_back_does_not_drift(self) -> None:
+        for file_name, lazy in self._files:
+            with self.subTest(file_name=file_name):
+                self.assertTrue(Database.load_database(file_name, lazy=lazy))
+                before = database_state()
+
+                entries = [entry for entry in Database.statement_entries if entry.included_monthly][:50]
+                for _ in range(3):
+                    for entry in entries:
+                        Database.update_user_excluded(entry)
+                        Database.update_user_excluded(entry)
+                self.assertEqual(database_state(), before)
+
+                # excluded then included again one at a time
+                for entry in entries:
+                    Database.update_user_excluded(entry)
+                self.assertEqual(database_state(), generated_state())
+                for entry in entries:
+                    Database.update_user_excluded(entry)
+                self.assertEqual(database_state(), before)
+
+
+# -----------------------------------------------------------------------
+# changes saved to a file's journal are replayed when it is loaded, eagerly
+# or lazily, and the journal is compacted into the file once it is long
+class TestJournal(unittest.TestCase):
+
+    def setUp(self) -> None:
+        Logger.set_level(Logger.ERROR)
+        self._directory = tempfile.TemporaryDirectory()
+        self._file = os.path.join(self._directory.name, 'statement.mrb')
+        text_file = os.path.join(self._directory.name, 'statement.txt')
+        with open(text_file, mode='w', encoding='utf-8') as f:
+            f.writelines(shuffled_file_lines(2000, 0))
+        Database.load_database(text_file)
+        self.assertTrue(Database.write_file(self._file))
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+        Logger.set_level(Logger.INFO)
+
+    def make_changes(self, seed: int) -> None:
+        rnd = random.Random(seed)
+        start = datetime.date(2020, 1, 6).toordinal()
+        last = max(entry.date for entry in Database.statement_entries).toordinal()
+        entries = []
+        for i in range(100):
+            date = datetime.date.fromordinal(last + 1 + rnd.randrange(30))
+            entries.append(StatementData.StatementEntry(
+                type=StatementData.StatementEntryType.CASH_PLUS,
+                amount=rnd.randint(-50000, 20000),
+                balance=rnd.randint(0, 1000000),
+                date=date,
+                week_no=(date.toordinal() - start) // 7,
+                included_weekly=rnd.random() < 0.5,
+                included_monthly=rnd.random() < 0.5,
+                description=f'NEW {seed} {i}'))
+        Database.merge_statement_entries(entries)
+        Database.update_summaries()
+        Database.set_dirty()
+
+        for n in rnd.sample(range(len(Database.statement_entries)), 50):
+            Database.update_user_excluded(Database.statement_entries[n])
+
+    def file_bytes(self) -> bytes:
+        with open(self._file, mode='rb') as f:
+            return f.read()
+
+    def assert_loads(self, expected: tuple) -> None:
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                self.assertTrue(Database.load_database(self._file, lazy=lazy))
+                self.assertEqual(database_state(), expected)
+                self.assertEqual(database_state(), generated_state())
+
+    def test_replay(self) -> None:
+        journal = Database.journal_name(self._file)
+        self.assertTrue(Database.load_database(self._file))
+        contents = self.file_bytes()
+        self.make_changes(1)
+        self.assertTrue(Database.save_file(self._file, compact=False))
+        expected = database_state()
+
+        # the changes are only in the journal
+        self.assertEqual(self.file_bytes(), contents)
+        self.assertTrue(os.path.exists(journal))
+        self.assertEqual(len(Database.unsaved_entries), 0)
+        self.assertEqual(len(Database.unsaved_updates), 0)
+        self.assertEqual(Database.journal_records, 150)
+        self.assert_loads(expected)
+        self.assertEqual(Database.journal_records, 150)
+
+        # later changes are appended to it
+        self.make_changes(2)
+        self.assertTrue(Database.save_file(self._file, compact=False))
+        expected = database_state()
+        self.assertEqual(Database.journal_records, 300)
+        self.assert_loads(expected)
+
+    def test_partial_record(self) -> None:
+        journal = Database.journal_name(self._file)
+        self.assertTrue(Database.load_database(self._file))
+        self.make_changes(1)
+        self.assertTrue(Database.save_file(self._file, compact=False))
+        expected = database_state()
+        size = os.path.getsize(journal)
+
+        # a record cut short while it was appended
+        with open(journal, mode='a', encoding='utf-8', newline='') as f:
+            f.write('A,"Cashplus, -£1')
+        self.assert_loads(expected)
+        self.assertEqual(os.path.getsize(journal), size)
+
+        # the next append starts on a new line
+        self.make_changes(2)
+        self.assertTrue(Database.save_file(self._file, compact=False))
+        expected = database_state()
+        self.assert_loads(expected)
+
+    def test_compaction(self) -> None:
+        journal = Database.journal_name(self._file)
+        self.assertTrue(Database.load_database(self._file))
+        self.make_changes(1)
+        self.assertTrue(Database.save_file(self._file, compact=False))
+
+        # not yet due
+        self.make_changes(2)
+        self.assertFalse(Database.is_compaction_due())
+        self.assertTrue(Database.save_file(self._file))
+        self.assertTrue(os.path.exists(journal))
+
+        self.addCleanup(setattr, Database, 'JOURNAL_RECORDS', Database.JOURNAL_RECORDS)
+        Database.JOURNAL_RECORDS = 100
+        self.make_changes(3)
+        self.assertTrue(Database.is_compaction_due())
+        contents = self.file_bytes()
+
+        # keep the journal as it is just before the file is written
+        journals = []
+        append_journal = Database.append_journal
+
+        def appended(filename: str) -> bool:
+            result = append_journal(filename)
+            with open(journal, mode='rb') as f:
+                journals.append(f.read())
+            return result
+
+        with unittest.mock.patch.object(Database, 'append_journal', appended):
+            self.assertTrue(Database.save_file(self._file))
+        expected = database_state()
+
+        # the whole file is written and its journal removed
+        self.assertFalse(os.path.exists(journal))
+        self.assertNotEqual(self.file_bytes(), contents)
+        self.assertEqual(Database.journal_records, 0)
+        self.assert_loads(expected)
+
+        # a journal left behind by a crash during compaction changes nothing
+        self.assertEqual(len(journals), 1)
+        with open(journal, mode='wb') as f:
+            f.write(journals[0])
+        self.assert_loads(expected)
+
+
+if __name__ == '__main__':
+    unittest.main()